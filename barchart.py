@@ -1,11 +1,269 @@
+import argparse
 import pandas as pd
-import plotly.io as pio
-import plotly.graph_objects as go
-import matplotlib.pyplot as plt
 import traceback
 import numpy as np
 import json
 import os
+import hashlib
+import math
+from collections import Counter
+from collections.abc import Sequence
+from functools import cached_property
+from itertools import chain
+from csv_cache import intern_categories, intern_text, load_master_csv
+import instrument
+
+# strikezone constants
+ZONE_WIDTH = 17 * 0.0833  # 17 inches converted to feet
+ZONE_HEIGHT_LOW = 1.5     # Approximately knee height
+ZONE_HEIGHT_HIGH = 3.5    # Approximately mid-chest height
+
+# total bases for each PlayResult that counts as a hit
+HIT_BASES = {"Single": 1, "Double": 2, "Triple": 3, "HomeRun": 4}
+
+# plate zone counter increments for each outcome, same order as Batter.plate_zones_avg:
+# plate appearances, at bats, contacts, whiffs, hits, total bases, walks, strikeouts, summed exit velo, in play
+ZONE_OUTCOME_INCREMENTS = {
+    "Strikeout Swing":   (1, 1, 0, 1, 0, 0, 0, 1, 0, 0),
+    "Strikeout Looking": (1, 1, 0, 0, 0, 0, 0, 1, 0, 0),
+    "Out":               (1, 1, 1, 0, 0, 0, 0, 0, 0, 1),
+    "Single":            (1, 1, 1, 0, 1, 1, 0, 0, 0, 1),
+    "Double":            (1, 1, 1, 0, 1, 2, 0, 0, 0, 1),
+    "Triple":            (1, 1, 1, 0, 1, 3, 0, 0, 0, 1),
+    "HomeRun":           (1, 1, 1, 0, 1, 4, 0, 0, 0, 1),
+    "Walk":              (1, 0, 0, 0, 0, 0, 1, 0, 0, 0),
+    "Hit by Pitch":      (1, 0, 0, 0, 0, 0, 1, 0, 0, 0),
+    "Foul ball":         (0, 0, 1, 0, 0, 0, 0, 0, 0, 0),
+    "Whiff":             (0, 0, 0, 1, 0, 0, 0, 0, 0, 0),
+}
+NO_ZONE_INCREMENT = (0,) * 10
+
+# per-pitch batter counters summed by batter_increments, same meaning as the Batter fields
+BATTER_TOTALS = ('plate_appearances', 'at_bats', 'hits', 'total_bases', 'walks', 'strikeouts',
+                 'contacts', 'exit_velocity', 'launch_angle')
+
+# placeholder wOBA weights (walks, then four hit weights)
+WOBA_WEIGHTS = (.69, .89, 1.27, 1.62, 2.10)
+
+# ColorBrewer anchors of matplotlib's Reds and Blues colormaps (as matplotlib stores them), so the zone colors
+# don't need matplotlib (it took longer to import than everything else combined)
+COLORMAP_ANCHORS = {
+    'Reds': [
+        (1.0, 0.9607843137254902, 0.9411764705882353),
+        (0.996078431372549, 0.8784313725490196, 0.8235294117647058),
+        (0.9882352941176471, 0.7333333333333333, 0.6313725490196078),
+        (0.9882352941176471, 0.5725490196078431, 0.4470588235294118),
+        (0.984313725490196, 0.41568627450980394, 0.2901960784313726),
+        (0.9372549019607843, 0.23137254901960785, 0.17254901960784313),
+        (0.796078431372549, 0.09411764705882353, 0.11372549019607843),
+        (0.6470588235294118, 0.058823529411764705, 0.08235294117647057),
+        (0.403921568627451, 0.0, 0.05098039215686274),
+    ],
+    'Blues': [
+        (0.9686274509803922, 0.984313725490196, 1.0),
+        (0.8705882352941177, 0.9215686274509803, 0.9686274509803922),
+        (0.7764705882352941, 0.8588235294117647, 0.9372549019607843),
+        (0.6196078431372549, 0.792156862745098, 0.8823529411764706),
+        (0.4196078431372549, 0.6823529411764706, 0.8392156862745098),
+        (0.25882352941176473, 0.5725490196078431, 0.7764705882352941),
+        (0.12941176470588237, 0.44313725490196076, 0.7098039215686275),
+        (0.03137254901960784, 0.3176470588235294, 0.611764705882353),
+        (0.03137254901960784, 0.18823529411764706, 0.4196078431372549),
+    ],
+}
+COLORMAP_SIZE = 256
+
+
+def _colormap_table(anchors, size=COLORMAP_SIZE):
+    # the 256 step lookup table matplotlib builds from the anchors, with the same
+    # arithmetic (np.interp rounds a few entries differently in the last bit)
+    anchors = np.array(anchors)
+    steps = np.linspace(0, 1, len(anchors)) * (size - 1)
+    x = ((size - 1) * np.linspace(0, 1, size))[1:-1]
+    ind = np.searchsorted(steps, x)
+    distance = ((x - steps[ind - 1]) / (steps[ind] - steps[ind - 1]))[:, None]
+    inner = distance * (anchors[ind] - anchors[ind - 1]) + anchors[ind - 1]
+    return np.clip(np.vstack([anchors[:1], inner, anchors[-1:]]), 0.0, 1.0)
+
+
+COLORMAPS = {name: _colormap_table(anchors) for name, anchors in COLORMAP_ANCHORS.items()}
+
+
+def colormap_rgb(name, value):
+    """
+    Look up a 0-1 value in one of the COLORMAPS, like matplotlib's plt.cm.Reds(value).
+
+    Values below 0 or above 1 get the end colors, NaN gets black.
+
+    Returns:
+        tuple: (r, g, b) floats between 0 and 1.
+    """
+    if np.isnan(value):
+        return (0.0, 0.0, 0.0)
+    table = COLORMAPS[name]
+    index = 0 if value < 0 else min(int(value * len(table)), len(table) - 1)
+    return tuple(table[index])
+
+
+# every outcome label classify_outcomes gives, the categories of PitchTable's outcome column
+OUTCOMES = ("Single", "Double", "Triple", "HomeRun", "Out", "Sac Fly", "Sac Bunt", "Strikeout Swing",
+            "Strikeout Looking", "Strikeout", "Walk", "Whiff", "Called Strike", "Ball", "Intentional Ball",
+            "Foul ball", "Hit by Pitch", "Undefined")
+
+# the TrackMan columns an outcome depends on, in classify_outcome argument order
+OUTCOME_COLUMNS = ("PitchCall", "PlayResult", "KorBB", "TaggedHitType")
+
+
+def classify_outcomes(pitch_call, play_result, KorBB, tagged_result):
+    """
+    Classify many pitches at once from their TrackMan call columns.
+
+    Rules are checked top to bottom with np.select, the first match wins:
+    balls in play by PlayResult (sacrifices by TaggedHitType), then strikeouts
+    and walks by KorBB, then the plain pitch calls. Anything else is "Undefined".
+
+    Args:
+        pitch_call, play_result, KorBB, tagged_result (array-like): Equal length columns.
+
+    Returns:
+        tuple: (np.ndarray of outcome labels from OUTCOMES, np.ndarray of bools,
+        True when the pitch ended the plate appearance)
+    """
+    pitch_call, play_result, KorBB, tagged_result = (np.asarray(c, dtype=object)
+                                                     for c in (pitch_call, play_result, KorBB, tagged_result))
+    in_play = pitch_call == "InPlay"
+    sacrifice = in_play & (play_result == "Sacrifice")
+    strikeout = ~in_play & (KorBB == "Strikeout")
+    walk = ~in_play & ~strikeout & (KorBB == "Walk")
+    plain = ~in_play & ~strikeout & ~walk
+    swinging = pitch_call == "StrikeSwinging"
+    called = pitch_call == "StrikeCalled"
+    rules = [
+        # (condition, outcome, ends the plate appearance)
+        (in_play & (play_result == "Single"), "Single", True),
+        (in_play & (play_result == "Double"), "Double", True),
+        (in_play & (play_result == "Triple"), "Triple", True),
+        (in_play & (play_result == "HomeRun"), "HomeRun", True),
+        (in_play & (play_result == "Out"), "Out", True),
+        (sacrifice & (tagged_result == "FlyBall"), "Sac Fly", True),
+        (sacrifice & (tagged_result == "Bunt"), "Sac Bunt", True),
+        (in_play, "Undefined", True),
+        (strikeout & swinging, "Strikeout Swing", True),
+        (strikeout & called, "Strikeout Looking", True),
+        (strikeout, "Strikeout", True),
+        (walk, "Walk", True),
+        (plain & swinging, "Whiff", False),
+        (plain & called, "Called Strike", False),
+        (plain & (pitch_call == "BallCalled"), "Ball", False),
+        (plain & (pitch_call == "BallIntentional"), "Intentional Ball", False),
+        (plain & ((pitch_call == "FoulBallNotFieldable") | (pitch_call == "FoulBallFieldable")), "Foul ball", False),
+        (plain & (pitch_call == "HitByPitch"), "Hit by Pitch", True),
+    ]
+    conditions = [condition for condition, _, _ in rules]
+    outcomes = np.select(conditions, [np.array(outcome, dtype=object) for _, outcome, _ in rules], "Undefined")
+    actions = np.select(conditions, [action for _, _, action in rules], False)
+    return outcomes, actions.astype(bool)
+
+
+# (pitch_call, play_result, KorBB, tagged_result) -> (outcome, action) for classify_outcome
+_outcome_lookup = {}
+
+
+def classify_outcome(pitch_call, play_result, KorBB, tagged_result):
+    """
+    Classify a pitch from its TrackMan call columns, see classify_outcomes for the rules.
+
+    Each combination is classified once and then looked up, so pitches added one
+    at a time don't pay for the vectorized rules every call.
+
+    Returns:
+        tuple: (outcome label, whether the pitch ended the plate appearance)
+    """
+    key = (pitch_call, play_result, KorBB, tagged_result)
+    result = _outcome_lookup.get(key)
+    if result is None:
+        outcomes, actions = classify_outcomes(*([value] for value in key))
+        result = (outcomes[0], bool(actions[0]))
+        if len(_outcome_lookup) < 4096:  # NaN keys never match, don't let them pile up
+            _outcome_lookup[key] = result
+    return result
+
+
+def report_unknown_outcomes(counts):
+    """
+    Print one line per call column combination that was classified as "Undefined".
+
+    Args:
+        counts (dict): (pitch_call, play_result, KorBB, tagged_result) -> number of pitches.
+    """
+    if not counts:
+        return
+    print(f"{sum(counts.values())} pitches with unrecognized calls were classified as Undefined:")
+    for key, n in sorted(counts.items(), key=lambda item: -item[1]):
+        print(f"  {n:>6}  " + ", ".join(f"{column}={value}" for column, value in zip(OUTCOME_COLUMNS, key)))
+
+
+def _exact_sum(total, rest, values):
+    """
+    Add values to a sum kept as (rounded sum, rounding remainder).
+
+    Both come from math.fsum, so the pair holds the sum exactly (the remainder
+    is a few bits for measured values) and adding the same values in one array
+    or in any number of pieces ends in the same pair.
+    """
+    values = values.tolist()
+    new_total = math.fsum(chain((total, rest), values))
+    return new_total, math.fsum(chain((total, rest, -new_total), values))
+
+
+class RunningStat:
+    """
+    Running count, exact sum and sum of squares, and max of a measurement.
+
+    The sums are kept exactly (see _exact_sum) and avg/std are worked out from
+    them, so adding values one at a time, as one array or in chunks (the way
+    SeasonState folds games) gives bit-for-bit the same results.
+    """
+    __slots__ = ('count', 'total', 'total_rest', 'squares', 'squares_rest', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.total_rest = 0.0
+        self.squares = 0.0
+        self.squares_rest = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.add_array([value])
+
+    def add_array(self, values):
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return
+        self.total, self.total_rest = _exact_sum(self.total, self.total_rest, values)
+        self.squares, self.squares_rest = _exact_sum(self.squares, self.squares_rest, values * values)
+        # same result as max() over every value seen so far
+        batch_max = np.fmax.reduce(values)
+        if self.count == 0 or batch_max > self.max:
+            self.max = batch_max
+        self.count += len(values)
+
+    @property
+    def avg(self):
+        return self.total / self.count if self.count > 0 else 0.0
+
+    @property
+    def m2(self):
+        """Sum of squared differences from the mean."""
+        if self.count == 0:
+            return 0.0
+        return max(math.fsum((self.squares, self.squares_rest, -self.total * self.total / self.count)), 0.0)
+
+    @property
+    def std(self):
+        return (self.m2 / self.count) ** 0.5 if self.count > 0 else 0.0
+
 
 class Pitcher:
 
@@ -16,7 +274,44 @@ class Pitcher:
         self.avg_spin = 0.0
         self.max_speed = 0.0
         self.max_spin = 0.0
+        self.speed_std = 0.0
+        self.spin_std = 0.0
         self.pitch_mix= 0
+        self.pitch_type_stats = None  # per pitch type breakdown, filled in by pitcher_stats.load_staff
+
+        # running accumulators so adding a pitch never rescans self.pitches
+        self.speed = RunningStat()
+        self.spin = RunningStat()
+        self.pitch_type_counts = Counter()
+        for p in pitches:
+            self.speed.add(p.rel_speed)
+            self.spin.add(p.spin_rate)
+            self.pitch_type_counts[p.pitch_type] += 1
+        self._update_fields()
+
+    @classmethod
+    def from_frame(cls, name, rows):
+        """
+        Build a pitcher from rows of the master CSV in one vectorized pass.
+
+        Args:
+            name (str): Pitcher name.
+            rows (pd.DataFrame): Rows of the master CSV thrown by this pitcher.
+        """
+        pitcher = cls(name, [])
+        pitcher.add_pitches(rows)
+        return pitcher
+
+    def _update_fields(self):
+        if self.speed.count == 0:
+            return
+        self.avg_speed = self.speed.avg
+        self.avg_spin = self.spin.avg
+        self.max_speed = self.speed.max
+        self.max_spin = self.spin.max
+        self.speed_std = self.speed.std
+        self.spin_std = self.spin.std
+        self.pitch_mix = len(self.pitch_type_counts)
 
     def add_pitch(self, pitch):
         """
@@ -25,12 +320,52 @@ class Pitcher:
         Args:
             pitch (Pitch): The pitch object to be added.
         """
+        if not isinstance(self.pitches, list):
+            self.pitches = list(self.pitches)
         self.pitches.append(pitch)
-        self.avg_speed = sum(p.rel_speed for p in self.pitches) / len(self.pitches)
-        self.avg_spin = sum(p.spin_rate for p in self.pitches) / len(self.pitches)
-        self.max_speed = max(p.rel_speed for p in self.pitches)
-        self.max_spin = max(p.spin_rate for p in self.pitches)
-        self.pitch_mix = len(set(p.pitch_type for p in self.pitches))
+        self.speed.add(pitch.rel_speed)
+        self.spin.add(pitch.spin_rate)
+        self.pitch_type_counts[pitch.pitch_type] += 1
+        self._update_fields()
+
+    def pitch_table(self):
+        """(PitchTable, rows) of the pitches, what pitch_query.batter_query builds its indexes on."""
+        return pitch_table_rows(self.pitches)
+
+    def add_pitches(self, rows):
+        """
+        Add every pitch in a slice of the master CSV in one pass.
+
+        Args:
+            rows (pd.DataFrame): Rows of the master CSV thrown by this pitcher.
+        """
+        # a pitcher has no use for outcomes, so unknown calls aren't reported here
+        self.add_rows(PitchTable(rows, report=False), np.arange(len(rows)))
+
+    def add_rows(self, table, rows):
+        """
+        Add pitches stored in a PitchTable, summarizing them with column operations.
+
+        Args:
+            table (PitchTable): Table holding the pitches.
+            rows (array-like): Row positions of this pitcher's pitches.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        instrument.count("pitches_added", len(rows))
+        if isinstance(self.pitches, PitchRows) and self.pitches.table is table:
+            self.pitches = PitchRows(table, np.concatenate([self.pitches.rows, rows]))
+        elif len(self.pitches) == 0:
+            self.pitches = PitchRows(table, rows)
+        else:
+            self.pitches = list(self.pitches) + table.pitches(rows)
+
+        self.speed.add_array(table.frame['rel_speed'].to_numpy()[rows])
+        self.spin.add_array(table.frame['spin_rate'].to_numpy()[rows])
+        pitch_types = table.frame['pitch_type'].cat.categories
+        codes, counts = np.unique(table.codes('pitch_type', rows), return_counts=True)
+        for code, count in zip(codes, counts):
+            self.pitch_type_counts[pitch_types[code] if code >= 0 else np.nan] += int(count)
+        self._update_fields()
 
 
 
@@ -42,9 +377,10 @@ class Batter:
     """
     A class representing a baseball player with their pitches and stats.
     """
-    def __init__(self, name, role):
+    def __init__(self, name, role, grid=None):
         self.name = name
         self.role = role
+        self.grid = grid if grid is not None else DEFAULT_ZONE_GRID  # plate zone layout, see ZoneGrid
         self.pitches = []  # Array to store pitch objects
         self.pitchers_faced = []
         self.at_bats= 0
@@ -66,106 +402,26 @@ class Batter:
         self.avg_launch_angle = 0.0
         self.max_exit_velocity = 0.0
         self.contacts = 0
-
-       # 4x4 grid of plate zones, z1 = avg, z2 = slg, z3 = avg exit velocity
-        self.plate_zones_avg = {
-            0: [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],  # plate appearances, at bats, contacts, whiffs, hits, total bases, walks, strikeouts, avg exit velocity
-            1: [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],  # plate appearances, at bats, contacts, whiffs, hits, total bases, walks, strikeouts, avg exit velocity
-            2: [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            3: [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            4: [0, 0, 0, 0, 0, 0, 0, 0, 0, 0], 
-            5: [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            6: [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            7: [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            8: [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            9: [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            10: [0, 0, 0, 0, 0, 0, 0, 0, 0,0],
-            11: [0, 0, 0, 0, 0, 0, 0, 0, 0,0],
-            12: [0, 0, 0, 0, 0, 0, 0, 0, 0,0],
-            13: [0, 0, 0, 0, 0, 0, 0, 0, 0,0],
-            14: [0, 0, 0, 0, 0, 0, 0, 0, 0,0],
-            15: [0, 0, 0, 0, 0, 0, 0, 0, 0,0],
-            16: [0, 0, 0, 0, 0, 0, 0, 0, 0,0],           
-        }
-                 # avg, slg, avg exit velocity, whiff rate
-        self.plate_zone_stats = {
-            0: [0, 0, 0, 0],
-            1: [0, 0, 0, 0],
-            2: [0, 0, 0, 0], 
-            3: [0, 0, 0, 0],
-            4: [0, 0, 0, 0],
-            5: [0, 0, 0, 0],
-            6: [0, 0, 0, 0],
-            7: [0, 0, 0, 0],
-            8: [0, 0, 0, 0],
-            9: [0, 0, 0, 0],
-            10: [0, 0, 0, 0],
-            11: [0, 0, 0, 0],
-            12: [0, 0, 0, 0],
-            13: [0, 0, 0, 0],
-            14: [0, 0, 0, 0],
-            15: [0, 0, 0, 0],
-            16: [0, 0, 0, 0]
-        }
+        self.unknown_outcomes = Counter()  # call combinations add_pitch/add_pitches couldn't classify, see report_unknown_outcomes
+        self._reported_outcomes = Counter()  # the part of unknown_outcomes calculate_stats already printed
+
+        # one row per plate zone of self.grid (the 4x4 grid plus zone 0 for pitches outside it by default):
+        # plate appearances, at bats, contacts, whiffs, hits, total bases, walks, strikeouts, summed exit velocity, in play
+        self.plate_zones_avg = np.zeros((self.grid.zone_count, 10))
+        # avg, slg, avg exit velocity, whiff rate
+        self.plate_zone_stats = np.zeros((self.grid.zone_count, 4))
            
         # wOBA weights
-        self.a = .69
-        self.b = .89
-        self.c = 1.27
-        self.d = 1.62
-        self.e = 2.10
-
-
-    def get_outcome(self, pitch):   
-        # print("pitch call ", pitch.pitch_call)
-        # print("play result ", pitch.play_result)
-        if pitch.pitch_call == "InPlay":
-            if pitch.play_result == "Single":
-                return "Single", True
-            elif pitch.play_result == "Double":
-                return "Double", True
-            elif pitch.play_result == "Triple":
-                return "Triple", True
-            elif pitch.play_result == "HomeRun":
-                return "HomeRun", True
-            elif pitch.play_result == "Out":
-                return "Out", True
-            elif pitch.play_result == "Sacrifice":
-                if pitch.tagged_result == "FlyBall":
-                    return "Sac Fly", True
-                elif pitch.tagged_result == "Bunt":
-                    return "Sac Bunt", True
-                else:
-                    print("Tagged result ", pitch.tagged_result, " is not accounted for")
-                    return "Undefined", True
-        elif pitch.KorBB == "Strikeout":
-            if pitch.pitch_call == "StrikeSwinging":
-                return "Strikeout Swing", True
-            elif pitch.pitch_call == "StrikeCalled":
-                return "Strikeout Looking", True
-            else:
-                return "Strikeout", True
-        elif pitch.KorBB == "Walk":
-            return "Walk", True
-        elif pitch.pitch_call == "StrikeSwinging":
-            return "Whiff", False
-        elif pitch.pitch_call == "StrikeCalled":
-            return "Called Strike", False
-        elif pitch.pitch_call == "BallCalled":
-            return "Ball", False
-        elif pitch.pitch_call == "BallIntentional":
-            return "Intentional Ball", False
-        elif pitch.pitch_call == "FoulBallNotFieldable" or pitch.pitch_call == "FoulBallFieldable":
-            return "Foul ball", False
-        elif pitch.pitch_call == "HitByPitch":
-            return "Hit by Pitch", True
-        else:
-            print("play_call ", pitch.pitch_call, " is not accounted for")
-            return "Undefined", False
-             
+        self.a, self.b, self.c, self.d, self.e = WOBA_WEIGHTS
+
+
+    def get_outcome(self, pitch):
+        return classify_outcome(pitch.pitch_call, pitch.play_result, pitch.KorBB, pitch.tagged_result)
 
-    
     def add_pitch(self, p):
+        instrument.count("add_pitch_calls")
+        if not isinstance(self.pitches, list):
+            self.pitches = list(self.pitches)
         self.pitches.append(p)
         self.pitchers_faced.append(p.pitcher_name)
         # add logic for batter stats vs a pitcher
@@ -177,7 +433,6 @@ class Batter:
             self.max_exit_velocity = p.exit_velocity if p.exit_velocity > self.max_exit_velocity else self.max_exit_velocity
             self.avg_exit_velocity += p.exit_velocity
             self.avg_launch_angle += p.launch_angle
-            p.outcome,p.action = self.get_outcome(p)
         elif p.play_result != "Undefined" or p.KorBB != "Undefined":
             self.at_bats += 1
             self.plate_appearances += 1
@@ -218,89 +473,80 @@ class Batter:
             # print("Error entering batter stats during add pitch")
             pass
         p.outcome,p.action = self.get_outcome(p)
+        if p.outcome == "Undefined":
+            self.unknown_outcomes[(p.pitch_call, p.play_result, p.KorBB, p.tagged_result)] += 1
         p.zone = get_zone_number(p.plateLocSide, p.plateLocHeight,p.zone_width, p.zone_height_low, p.zone_height_high)
+        # the pitch keeps its 4x4 zone, the counters use this batter's grid
+        zone = p.zone if self.grid == DEFAULT_ZONE_GRID else int(self.grid.zone_numbers(p.plateLocSide, p.plateLocHeight))
       
         # print("pzone ", p.zone)
 
-        if p.zone in self.plate_zones_avg:
-            if p.outcome == "Strikeout Swing":
-                self.plate_zones_avg[p.zone][0] += 1 #pa
-                self.plate_zones_avg[p.zone][1] += 1 #atbat
-                self.plate_zones_avg[p.zone][3] += 1 #whiffs
-                self.plate_zones_avg[p.zone][7] += 1 #strikeouts
-            elif p.outcome == "Strikeout Looking":
-                self.plate_zones_avg[p.zone][0] += 1 #pa
-                self.plate_zones_avg[p.zone][1] += 1 #atbat
-                self.plate_zones_avg[p.zone][7] += 1 #strikeouts 
-            elif p.outcome == "Out":
-                self.plate_zones_avg[p.zone][0] += 1 #pa
-                self.plate_zones_avg[p.zone][1] += 1 #atbat
-                self.plate_zones_avg[p.zone][2] += 1 #contacts
-                self.plate_zones_avg[p.zone][8] += p.exit_velocity #avg exit velocity
-                self.plate_zones_avg[p.zone][9] += 1 #in play
-            elif p.outcome == "Single":
-                self.plate_zones_avg[p.zone][0] += 1 #pa
-                self.plate_zones_avg[p.zone][1] += 1 #atbat
-                self.plate_zones_avg[p.zone][2] += 1 #contacts
-                self.plate_zones_avg[p.zone][4] += 1 #hits
-                self.plate_zones_avg[p.zone][5] += 1 #total bases
-                self.plate_zones_avg[p.zone][8] += p.exit_velocity #avg exit velocity
-                self.plate_zones_avg[p.zone][9] += 1 #in play
-            elif p.outcome == "Double":
-                self.plate_zones_avg[p.zone][0] += 1 #pa
-                self.plate_zones_avg[p.zone][1] += 1 #atbat
-                self.plate_zones_avg[p.zone][2] += 1 #contacts
-                self.plate_zones_avg[p.zone][4] += 1 #hits
-                self.plate_zones_avg[p.zone][5] += 2 #total bases
-                self.plate_zones_avg[p.zone][8] += p.exit_velocity #avg exit velocity
-                self.plate_zones_avg[p.zone][9] += 1 #in play
-            elif p.outcome == "Triple":
-                self.plate_zones_avg[p.zone][0] += 1 #pa
-                self.plate_zones_avg[p.zone][1] += 1 #atbat
-                self.plate_zones_avg[p.zone][2] += 1 #contacts
-                self.plate_zones_avg[p.zone][4] += 1 #hits
-                self.plate_zones_avg[p.zone][5] += 3 #total bases
-                self.plate_zones_avg[p.zone][8] += p.exit_velocity #avg exit velocity
-                self.plate_zones_avg[p.zone][9] += 1 #in play
-            elif p.outcome == "HomeRun":
-                self.plate_zones_avg[p.zone][0] += 1 #pa
-                self.plate_zones_avg[p.zone][1] += 1 #atbat
-                self.plate_zones_avg[p.zone][2] += 1 #contacts
-                self.plate_zones_avg[p.zone][4] += 1 #hits
-                self.plate_zones_avg[p.zone][5] += 4 #total bases
-                self.plate_zones_avg[p.zone][8] += p.exit_velocity #avg exit velocity
-                self.plate_zones_avg[p.zone][9] += 1 #in play
-            elif p.outcome == "Walk" or p.outcome == "Hit by Pitch":
-                self.plate_zones_avg[p.zone][0] += 1 #pa
-                self.plate_zones_avg[p.zone][6] += 1 #walks
-            elif p.outcome == "Foul ball":
-                self.plate_zones_avg[p.zone][2] += 1 #contacts
-            elif p.outcome == "Whiff":
-                self.plate_zones_avg[p.zone][3] += 1 #Whiffs
+        increments = ZONE_OUTCOME_INCREMENTS.get(p.outcome)
+        if increments is not None and 0 <= zone < len(self.plate_zones_avg):
+            self.plate_zones_avg[zone] += increments
+            if increments[9]:
+                self.plate_zones_avg[zone][8] += p.exit_velocity #avg exit velocity
             
+    def pitch_table(self):
+        """(PitchTable, rows) of the pitches, what pitch_query.batter_query builds its indexes on."""
+        return pitch_table_rows(self.pitches)
+
+    def add_pitches(self, rows):
+        """
+        Add every pitch in a slice of the master CSV in one pass.
+
+        Args:
+            rows (pd.DataFrame): Rows of the master CSV faced by this batter.
+        """
+        # unknown calls are kept with the batter and printed by calculate_stats
+        table = PitchTable(rows, report=False)
+        self.unknown_outcomes.update(table.unknown_outcomes)
+        self.add_rows(table, np.arange(len(rows)))
+
+    def add_rows(self, table, rows):
+        """
+        Add pitches stored in a PitchTable.
+
+        Gives the same counters as calling add_pitch once per row, but the
+        batter totals and plate zone counters are filled with column operations
+        and the pitches stay in the table instead of becoming Pitch objects.
+
+        Args:
+            table (PitchTable): Table holding the pitches.
+            rows (array-like): Row positions of this batter's pitches.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        instrument.count("pitches_added", len(rows))
+        if isinstance(self.pitches, PitchRows) and self.pitches.table is table:
+            self.pitches = PitchRows(table, np.concatenate([self.pitches.rows, rows]))
+        elif len(self.pitches) == 0:
+            self.pitches = PitchRows(table, rows)
+        else:
+            self.pitches = list(self.pitches) + table.pitches(rows)
+        self.pitchers_faced.extend(table.values('pitcher_name', rows))
+
+        increments, contact_exit_velocity = batter_increments(table, rows)
+        (plate_appearances, at_bats, hits, total_bases, walks, strikeouts,
+         contacts, exit_velocity_sum, launch_angle_sum) = increments.sum(axis=0)
+        self.plate_appearances += plate_appearances
+        self.at_bats += at_bats
+        self.hits += hits
+        self.total_bases += total_bases
+        self.walks += walks
+        self.strikeouts += strikeouts
+        self.contacts += contacts
+        self.avg_exit_velocity += exit_velocity_sum
+        self.avg_launch_angle += launch_angle_sum
+        self.max_exit_velocity = np.fmax.reduce(contact_exit_velocity, initial=self.max_exit_velocity)
+
+        # scatter every pitch's counter row into the zone matrix
+        zones, increments = zone_increments(table, rows, self.grid)
+        np.add.at(self.plate_zones_avg, zones, increments)
+
     def filter_pitches(self, data):
-        for index, row in data.iterrows():
-            if row['Batter'] == self.name:
-                pitch = Pitch(
-                    batter_name=row['Batter'],
-                    pitcher_name=row['Pitcher'],
-                    outcome="Undefined",
-                    action="Undefined",
-                    tagged_pitch_type=row['TaggedPitchType'],
-                    auto_pitch_type=row['AutoPitchType'],
-                    pitch_call=row['PitchCall'],
-                    rel_speed=row['RelSpeed'],
-                    spin_rate=row['SpinRate'],
-                    IVB=row['InducedVertBreak'],
-                    launch_angle=row['Angle'],
-                    exit_velocity=row['ExitSpeed'],
-                    tagged_result=row['TaggedHitType'],
-                    play_result=row['PlayResult'],
-                    KorBB=row['KorBB'],
-                    plateLocHeight=row['PlateLocHeight'],
-                    plateLocSide=row['PlateLocSide']
-                )
-                self.add_pitch(pitch)   
+        instrument.count("rows_scanned", len(data))
+        with instrument.span("filter_pitches"):
+            self.add_pitches(data[data['Batter'] == self.name])
 
     def get_stats(self):
         #returns field variables as a dictionary
@@ -322,10 +568,11 @@ class Batter:
             'avg_exit_velocity': self.avg_exit_velocity,
             'avg_launch_angle': self.avg_launch_angle,
             'max_exit_velocity': self.max_exit_velocity,    
-            'plate_zone_stats': self.plate_zone_stats,
+            'plate_zone_stats': {zone: stats.tolist() for zone, stats in enumerate(self.plate_zone_stats)},
         }
         return data
                 
+    @instrument.timed("calculate_stats")
     def calculate_stats(self):
         self.avg = self.hits / self.at_bats if self.at_bats > 0 else 0.0
         self.obp = (self.hits + self.walks) / self.plate_appearances if self.plate_appearances > 0 else 0.0
@@ -344,17 +591,10 @@ class Batter:
         # plate apearances, at bats, contacts, whiffs, hits, total bases, walks, strikeouts, summed exit velo,in play 
         print("Calculating batter stats...")
        
-        for i in range(len(self.plate_zones_avg)):
-            # if i == 1:
-            #     print(self.plate_zones_avg[i][0] > 0)
-            # print("plate zone ", i, " exit velo ", self.plate_zones_avg[i][8]," in play ", self.plate_zones_avg[i][9])
-            # if self.plate_zones_avg[i][0] > 0:
-                self.plate_zone_stats[i][0] = self.plate_zones_avg[i][4] / self.plate_zones_avg[i][1] if self.plate_zones_avg[i][1] > 0 else 0  # AVG = hits / at bats
-                self.plate_zone_stats[i][1] = self.plate_zones_avg[i][5] / self.plate_zones_avg[i][1] if self.plate_zones_avg[i][1] > 0 else 0  # SLG = total bases / at bats
-                self.plate_zone_stats[i][2] = self.plate_zones_avg[i][8] / self.plate_zones_avg[i][9] if self.plate_zones_avg[i][9] > 0 else 0  # AVG Exit Velocity = avg exit velocity / contacts
-                self.plate_zone_stats[i][3] = self.plate_zones_avg[i][3] / (self.plate_zones_avg[i][3] + self.plate_zones_avg[i][2]) if (self.plate_zones_avg[i][3] + self.plate_zones_avg[i][2]) > 0 else 0
-                # print("plate zone ", i, " whiffs ", self.plate_zones_avg[i][3], "  swings ", self.plate_zones_avg[i][2] + self.plate_zones_avg[i][3])
-               
+        self.plate_zone_stats = plate_zone_rates(self.plate_zones_avg)
+        # only what was added since the last call, so recalculating doesn't repeat the report
+        report_unknown_outcomes(self.unknown_outcomes - self._reported_outcomes)
+        self._reported_outcomes = self.unknown_outcomes.copy()
         
         print("Batter stats calculated.")
         # print("total exit velo: ", self.plate_zones_avg[2][8])
@@ -367,40 +607,522 @@ class Batter:
         
 
 class Pitch:
+    """
+    A single pitch. Slotted so a season of them stays small; pitches loaded in bulk
+    are built on demand from a PitchTable instead of being kept around.
+    """
+    __slots__ = ('batter_name', 'pitcher_name', 'outcome', 'action', 'pitch_type', 'pitch_call',
+                 'rel_speed', 'spin_rate', 'IVB', 'launch_angle', 'exit_velocity',
+                 'tagged_result', 'play_result', 'KorBB', 'plateLocHeight', 'plateLocSide', 'zone')
+
+    # srikezone constants, shared by every pitch
+    zone_width = ZONE_WIDTH
+    zone_height_low = ZONE_HEIGHT_LOW
+    zone_height_high = ZONE_HEIGHT_HIGH
+
     def __init__(self, batter_name, pitcher_name, outcome, action, tagged_pitch_type, auto_pitch_type, pitch_call, 
                  rel_speed, spin_rate, IVB, launch_angle, exit_velocity, 
                  tagged_result, play_result, KorBB,plateLocHeight,plateLocSide):
-        self.batter_name = batter_name
-        self.pitcher_name = pitcher_name
+        # names and call codes repeat on every pitch, interned they share one string each
+        # and the == checks in add_pitch and get_outcome are identity checks
+        self.batter_name = intern_text(batter_name)
+        self.pitcher_name = intern_text(pitcher_name)
         self.outcome = outcome
         self.action = action
-        self.pitch_type = auto_pitch_type if auto_pitch_type else tagged_pitch_type
-        self.pitch_call = pitch_call
+        self.pitch_type = intern_text(auto_pitch_type if auto_pitch_type else tagged_pitch_type)
+        self.pitch_call = intern_text(pitch_call)
         self.rel_speed = rel_speed
         self.spin_rate = spin_rate
         self.IVB = IVB
         self.launch_angle = launch_angle
         self.exit_velocity = exit_velocity
-        self.tagged_result = tagged_result 
-        self.play_result = play_result
-        self.KorBB = KorBB
+        self.tagged_result = intern_text(tagged_result)
+        self.play_result = intern_text(play_result)
+        self.KorBB = intern_text(KorBB)
         self.plateLocHeight = plateLocHeight
         self.plateLocSide = plateLocSide
-
-         # srikezone constants
-        self.zone_width = 17 * 0.0833  # 17 inches converted to feet
-        self.zone_height_low = 1.5     # Approximately knee height
-        self.zone_height_high = 3.5    # Approximately mid-chest height
+        self.zone = 0
         
         if str(launch_angle).strip() in ["Undefined", ""]:
             print("launch angle is undefined")
 
     def __repr__(self):
         return f"Pitch({self.batter_name}, {self.pitcher_name},{self.outcome},{self.action},{self.pitch_type}, {self.rel_speed},{self.exit_velocity},{self.launch_angle})"
-    
-        
 
-        
+
+class PitchTable:
+    """
+    Columnar store for the pitches of a master CSV.
+
+    Numeric columns are float arrays, text columns are pandas categoricals, and
+    outcome, action and zone are worked out once for the whole table. Batters and
+    pitchers keep row positions into the table and Pitch objects are only built
+    when someone iterates over them.
+    """
+    # Pitch attribute -> master CSV column
+    NUMERIC_COLUMNS = {
+        'rel_speed': 'RelSpeed',
+        'spin_rate': 'SpinRate',
+        'IVB': 'InducedVertBreak',
+        'launch_angle': 'Angle',
+        'exit_velocity': 'ExitSpeed',
+        'plateLocHeight': 'PlateLocHeight',
+        'plateLocSide': 'PlateLocSide',
+    }
+    CATEGORICAL_COLUMNS = {
+        'batter_name': 'Batter',
+        'pitcher_name': 'Pitcher',
+        'pitch_call': 'PitchCall',
+        'tagged_result': 'TaggedHitType',
+        'play_result': 'PlayResult',
+        'KorBB': 'KorBB',
+    }
+
+    @instrument.timed("table_build")
+    def __init__(self, data, report=True):
+        """
+        Args:
+            data (pd.DataFrame): Rows in the master CSV layout.
+            report (bool): Print the unknown call combinations (see
+                report_unknown_outcomes). Callers building a table per chunk
+                pass False and report unknown_outcomes once for the whole file.
+        """
+        instrument.count("table_rows", len(data))
+        columns = {}
+        # text columns become categoricals with interned categories, so the Pitch
+        # views built from them share their strings with every other table
+        for name, source in self.CATEGORICAL_COLUMNS.items():
+            columns[name] = intern_categories(data[source].astype('category'))
+        # AutoPitchType unless it is blank, same as Pitch; merged on category codes
+        # so no row is ever compared as a string
+        auto = data['AutoPitchType'].astype('category')
+        tagged = data['TaggedPitchType'].astype('category')
+        types = auto.cat.categories.union(tagged.cat.categories)
+        codes = auto.cat.set_categories(types).cat.codes.to_numpy()
+        blank = types.get_indexer([""])[0]
+        if blank >= 0:
+            codes = np.where(codes == blank, tagged.cat.set_categories(types).cat.codes.to_numpy(), codes)
+        columns['pitch_type'] = intern_categories(
+            pd.Series(pd.Categorical.from_codes(codes, types), index=data.index).cat.remove_unused_categories())
+        for name, source in self.NUMERIC_COLUMNS.items():
+            columns[name] = pd.to_numeric(data[source], errors='coerce').astype(float)
+        # game order for time windows (see game_windows.py), only when the file has the columns;
+        # dates repeat on every pitch of a game, so each distinct one is parsed once
+        if 'Date' in data.columns:
+            dates = data['Date'].astype('category')
+            parsed = pd.to_datetime(pd.Series(dates.cat.categories, dtype=object), errors='coerce', format='mixed')
+            columns['date'] = np.append(parsed.to_numpy(dtype='datetime64[ns]'),
+                                        np.datetime64('NaT', 'ns'))[dates.cat.codes.to_numpy()]
+        if 'GameID' in data.columns:
+            columns['game_id'] = intern_categories(data['GameID'].astype('category'))
+        self.frame = pd.DataFrame(columns).reset_index(drop=True)
+
+        self.frame['zone'] = get_zone_numbers(self.frame['plateLocSide'], self.frame['plateLocHeight'],
+                                              ZONE_WIDTH, ZONE_HEIGHT_LOW, ZONE_HEIGHT_HIGH).astype(np.int8)
+        self.frame['outcome'], self.frame['action'] = self._classify()
+        if report:
+            report_unknown_outcomes(self.unknown_outcomes)
+        self._grid_zones = {}  # ZoneGrid -> zone numbers, see zones()
+
+    @classmethod
+    def from_pitches(cls, pitches):
+        """Build a table from Pitch objects, e.g. a batter filled with add_pitch."""
+        columns = {source: [getattr(p, name) for p in pitches]
+                   for name, source in {**cls.CATEGORICAL_COLUMNS, **cls.NUMERIC_COLUMNS}.items()}
+        columns['TaggedPitchType'] = columns['AutoPitchType'] = [p.pitch_type for p in pitches]
+        return cls(pd.DataFrame(columns))
+
+    def _classify(self):
+        # the outcome only depends on the call columns, so classify each distinct combination once
+        keys = self.frame[['pitch_call', 'play_result', 'KorBB', 'tagged_result']]
+        combo = keys.groupby(list(keys.columns), dropna=False, sort=False, observed=True).ngroup().to_numpy()
+        _, first = np.unique(combo, return_index=True)
+        values = [keys[column].to_numpy(dtype=object)[first] for column in keys.columns]
+        outcomes, actions = classify_outcomes(*values)
+
+        # (pitch_call, play_result, KorBB, tagged_result) -> pitches classified as "Undefined"
+        unknown = np.flatnonzero(outcomes == "Undefined")
+        pitches = np.bincount(combo, minlength=len(first))
+        self.unknown_outcomes = Counter({tuple(v[i] for v in values): int(pitches[i]) for i in unknown})
+        codes = pd.Categorical(outcomes, categories=OUTCOMES).codes
+        return pd.Categorical.from_codes(codes[combo], OUTCOMES), actions[combo]
+
+    def save(self, folder):
+        """
+        Write the finished table (outcomes and zones included) to folder as .npy files, see load.
+
+        Categorical columns are stored as their codes, with the categories and
+        the fingerprint in table.json.
+        """
+        os.makedirs(folder, exist_ok=True)
+        meta = {'columns': self.frame.columns.tolist(), 'categories': {}, 'fingerprint': self.fingerprint,
+                'unknown_outcomes': [[list(key), n] for key, n in self.unknown_outcomes.items()]}
+        for column in self.frame.columns:
+            values = self.frame[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                meta['categories'][column] = values.cat.categories.tolist()
+                values = values.cat.codes
+            np.save(os.path.join(folder, f'{column}.npy'), values.to_numpy())
+        with open(os.path.join(folder, 'table.json'), 'w') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, folder):
+        """
+        A table written by save, memory-mapped.
+
+        Nothing is parsed, classified or binned again, and every process that
+        loads the same folder shares the same pages of it.
+        """
+        with open(os.path.join(folder, 'table.json')) as f:
+            meta = json.load(f)
+        columns = {}
+        for column in meta['columns']:
+            values = np.load(os.path.join(folder, f'{column}.npy'), mmap_mode='r')
+            if column in meta['categories']:
+                values = pd.Categorical.from_codes(values, [intern_text(c) for c in meta['categories'][column]])
+            columns[column] = values
+        table = cls.__new__(cls)
+        table.frame = pd.DataFrame(columns, copy=False)
+        table._grid_zones = {}
+        table.unknown_outcomes = Counter({tuple(key): n for key, n in meta['unknown_outcomes']})  # already reported
+        table.__dict__['fingerprint'] = meta['fingerprint']  # fills the cached_property
+        return table
+
+    def __len__(self):
+        return len(self.frame)
+
+    @cached_property
+    def fingerprint(self):
+        """Content hash of the table, computed on first use."""
+        return hashlib.sha1(pd.util.hash_pandas_object(self.frame, index=False).to_numpy().tobytes()).hexdigest()
+
+    def zones(self, grid=None, rows=None):
+        """
+        Zone number of every pitch on a ZoneGrid.
+
+        The default grid's zones are the table's 'zone' column, other grids are
+        binned on first use and kept for the next batter.
+        """
+        if grid is None or grid == DEFAULT_ZONE_GRID:
+            zones = self.frame['zone'].to_numpy()
+        else:
+            if grid not in self._grid_zones:
+                self._grid_zones[grid] = grid.zone_numbers(self.frame['plateLocSide'], self.frame['plateLocHeight'])
+            zones = self._grid_zones[grid]
+        return zones if rows is None else zones[rows]
+
+    def codes(self, name, rows=None):
+        """Integer category codes of a text column (-1 for missing values)."""
+        codes = self.frame[name].cat.codes.to_numpy()
+        return codes if rows is None else codes[rows]
+
+    def lookup(self, name, mapping, rows=None, default=0):
+        """
+        Map a text column through a dict using its category codes.
+
+        Args:
+            name (str): Categorical column.
+            mapping (dict): Category value -> result.
+            rows (array-like): Row positions, or None for every row.
+            default: Result for values missing from the mapping (and missing values).
+
+        Returns:
+            np.ndarray: Mapped value for every requested row.
+        """
+        categories = self.frame[name].cat.categories
+        table = np.array([mapping.get(c, default) for c in categories] + [default])
+        return table[self.codes(name, rows)]
+
+    def values(self, name, rows=None):
+        """Python values of a column for the requested rows."""
+        column = self.frame[name]
+        if rows is not None:
+            column = column.iloc[rows]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            return column.astype(object).tolist()
+        return column.tolist()
+
+    def groups(self, name):
+        """Row positions for every value of a column, in order of first appearance."""
+        return self.frame.groupby(name, sort=False, observed=True).indices
+
+    def pitches(self, rows=None):
+        """Build Pitch objects for the requested rows."""
+        if rows is None:
+            rows = np.arange(len(self))
+        fields = ['batter_name', 'pitcher_name', 'outcome', 'action', 'pitch_type', 'pitch_call',
+                  'rel_speed', 'spin_rate', 'IVB', 'launch_angle', 'exit_velocity',
+                  'tagged_result', 'play_result', 'KorBB', 'plateLocHeight', 'plateLocSide', 'zone']
+        pitches = []
+        for (batter, pitcher, outcome, action, pitch_type, call, speed, spin, ivb, angle, exit_velo,
+             tagged_result, play_result, korbb, height, side, zone) in zip(*(self.values(f, rows) for f in fields)):
+            p = Pitch(batter, pitcher, outcome, action, pitch_type, pitch_type, call, speed, spin, ivb,
+                      angle, exit_velo, tagged_result, play_result, korbb, height, side)
+            p.zone = zone
+            pitches.append(p)
+        return pitches
+
+
+class PitchRows(Sequence):
+    """
+    Read-only list of pitches backed by rows of a PitchTable.
+    """
+    def __init__(self, table, rows):
+        self.table = table
+        self.rows = np.asarray(rows, dtype=np.intp)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return PitchRows(self.table, self.rows[index])
+        return self.table.pitches(self.rows[[index]])[0]
+
+    def __iter__(self):
+        # build pitches a block at a time so a whole season is never held as objects
+        for start in range(0, len(self.rows), 4096):
+            yield from self.table.pitches(self.rows[start:start + 4096])
+
+    def __repr__(self):
+        return f"PitchRows({len(self.rows)} pitches)"
+
+
+def pitch_table_rows(pitches):
+    """
+    The PitchTable and row positions holding a batter's or pitcher's pitches.
+
+    PitchRows already are rows of a table; Pitch objects (from add_pitch) get a
+    small table of their own, with None for every row.
+    """
+    if isinstance(pitches, PitchRows):
+        return pitches.table, pitches.rows
+    return PitchTable.from_pitches(pitches), None
+
+
+@instrument.timed("load_batters")
+def load_batters(data, role="general", grid=None):
+    """
+    Build a Batter for every hitter in the master CSV with a single groupby.
+
+    Args:
+        data (pd.DataFrame or PitchTable): The master CSV.
+        role (str): Role given to every Batter.
+        grid (ZoneGrid): Plate zone layout, defaults to the 4x4 strike zone grid.
+
+    Returns:
+        dict: Batter objects keyed by batter name, in order of first appearance.
+    """
+    table = data if isinstance(data, PitchTable) else PitchTable(data)
+    batters = {}
+    for name, rows in table.groups('batter_name').items():
+        batter = Batter(name, role, grid)
+        batter.add_rows(table, rows)
+        batters[name] = batter
+    return batters
+
+
+def load_pitchers(data):
+    """
+    Build a Pitcher for every arm in the master CSV with a single groupby.
+
+    Args:
+        data (pd.DataFrame or PitchTable): The master CSV.
+
+    Returns:
+        dict: Pitcher objects keyed by pitcher name, in order of first appearance.
+    """
+    table = data if isinstance(data, PitchTable) else PitchTable(data)
+    pitchers = {}
+    for name, rows in table.groups('pitcher_name').items():
+        pitcher = Pitcher(name, [])
+        pitcher.add_rows(table, rows)
+        pitchers[name] = pitcher
+    return pitchers
+
+
+def batter_increments(table, rows=None):
+    """
+    Work out what every pitch adds to its batter's totals, following add_pitch.
+
+    Args:
+        table (PitchTable): Table holding the pitches.
+        rows (array-like): Row positions, or None for every row.
+
+    Returns:
+        tuple: (n x len(BATTER_TOTALS) array of increments, exit velocity of
+        balls in play with NaN for every other pitch)
+    """
+    exit_velocity = table.frame['exit_velocity'].to_numpy()
+    launch_angle = table.frame['launch_angle'].to_numpy()
+    if rows is not None:
+        exit_velocity = exit_velocity[rows]
+        launch_angle = launch_angle[rows]
+
+    # same branch order as add_pitch: outs, then hits, walks and strikeouts
+    out = table.lookup('play_result', {"Out": True}, rows, default=False)
+    counted = (out
+               | table.lookup('play_result', {"Undefined": False}, rows, default=True)
+               | table.lookup('KorBB', {"Undefined": False}, rows, default=True))
+    bases = table.lookup('play_result', HIT_BASES, rows)
+    hit = counted & ~out & (bases > 0)
+    walk = counted & ~out & ~hit & table.lookup('KorBB', {"Walk": True}, rows, default=False)
+    strikeout = counted & ~out & ~hit & ~walk & table.lookup('KorBB', {"Strikeout": True}, rows, default=False)
+    contact = out | hit
+
+    increments = np.column_stack([
+        counted,
+        counted & ~walk,
+        hit,
+        np.where(hit, bases, 0),
+        walk,
+        strikeout,
+        contact,
+        np.where(contact, exit_velocity, 0.0),
+        np.where(contact, launch_angle, 0.0),
+    ]).astype(float)
+    return increments, np.where(contact, exit_velocity, np.nan)
+
+
+def zone_increments(table, rows=None, grid=None):
+    """
+    Work out what every pitch adds to its batter's plate zone counters, following add_pitch.
+
+    Args:
+        table (PitchTable): Table holding the pitches.
+        rows (array-like): Row positions, or None for every row.
+        grid (ZoneGrid): Zone layout, defaults to the 4x4 strike zone grid.
+
+    Returns:
+        tuple: (zone number of every pitch, n x 10 array of plate_zones_avg increments)
+    """
+    zones = table.zones(grid, rows)
+    exit_velocity = table.frame['exit_velocity'].to_numpy()
+    if rows is not None:
+        exit_velocity = exit_velocity[rows]
+    # look up each pitch's counter row by outcome, in-play pitches also add their exit velo
+    increments = table.lookup('outcome', ZONE_OUTCOME_INCREMENTS, rows, default=NO_ZONE_INCREMENT).astype(float)
+    increments[:, 8] = np.where(increments[:, 9] > 0, exit_velocity, 0.0)
+    return zones, increments
+
+
+def roster_stats(data):
+    """
+    Compute batting stats for every hitter in the master CSV in one grouped pass.
+
+    Gives the same numbers as Batter.calculate_stats without building any Batter
+    objects. The result is indexed by batter name, so create_player_stats_bar_chart
+    can look a hitter up directly.
+
+    Args:
+        data (pd.DataFrame or PitchTable): The master CSV.
+
+    Returns:
+        pd.DataFrame: One row per batter, with the same stat names as Batter.get_stats.
+    """
+    table = data if isinstance(data, PitchTable) else PitchTable(data)
+    names = table.frame['batter_name'].cat.categories
+    codes = table.codes('batter_name')
+    known = codes >= 0
+
+    increments, contact_exit_velocity = batter_increments(table)
+    totals = np.zeros((len(names), len(BATTER_TOTALS)))
+    np.add.at(totals, codes[known], increments[known])
+    max_exit_velocity = np.zeros(len(names))
+    np.fmax.at(max_exit_velocity, codes[known], contact_exit_velocity[known])
+
+    return batting_stats_frame(totals, max_exit_velocity, names)
+
+
+def batting_stats_frame(totals, max_exit_velocity, names):
+    """
+    Turn summed BATTER_TOTALS rows into batting stats, with the Batter.calculate_stats formulas.
+
+    Args:
+        totals (np.ndarray): n x len(BATTER_TOTALS) sums, see batter_increments.
+        max_exit_velocity (np.ndarray): n hardest contacts.
+        names (array-like): n row labels.
+
+    Returns:
+        pd.DataFrame: Indexed by 'name', with the same stat names as Batter.get_stats.
+    """
+    totals = pd.DataFrame(totals, columns=BATTER_TOTALS)
+
+    def rate(numerator, denominator):
+        return np.divide(numerator, denominator, out=np.zeros(len(totals)), where=denominator > 0)
+
+    a, b, c, d, e = WOBA_WEIGHTS
+    hits, walks, at_bats, plate_appearances = totals['hits'], totals['walks'], totals['at_bats'], totals['plate_appearances']
+    stats = pd.DataFrame({
+        'hits': hits,
+        'walks': walks,
+        'strikeouts': totals['strikeouts'],
+        'total bases': totals['total_bases'],
+        'plate appearences': plate_appearances,
+        'at_bats': at_bats,
+        'contacts': totals['contacts'],
+        'avg': rate(hits, at_bats),
+        'obp': rate(hits + walks, plate_appearances),
+        'slg': rate(totals['total_bases'], at_bats),
+        'wobp': rate(a * walks + b * hits + c * hits + d * hits + e * hits, at_bats),
+        'k_rate': rate(totals['strikeouts'], at_bats),
+        'bb_rate': rate(walks, plate_appearances),
+        'avg_exit_velocity': rate(totals['exit_velocity'], totals['contacts']),
+        'avg_launch_angle': rate(totals['launch_angle'], totals['contacts']),
+        'max_exit_velocity': max_exit_velocity,
+    })
+    stats.insert(stats.columns.get_loc('wobp'), 'ops', stats['obp'] + stats['slg'])
+    stats.index = pd.Index(names, name='name')
+    return stats
+
+
+def batter_from_totals(name, role, grid, totals, max_exit_velocity, zone_counts):
+    """
+    A Batter filled from summed counters instead of pitches, ready for calculate_stats.
+
+    Args:
+        name (str): Batter name.
+        role (str): Role given to the Batter.
+        grid (ZoneGrid): Plate zone layout of zone_counts.
+        totals (array-like): len(BATTER_TOTALS) sums, see batter_increments.
+        max_exit_velocity (float): Hardest contact.
+        zone_counts (np.ndarray): zones x 10 plate zone counters, see zone_increments.
+
+    Returns:
+        Batter: With no pitches, only the counters.
+    """
+    batter = Batter(name, role, grid)
+    totals = dict(zip(BATTER_TOTALS, totals))
+    batter.plate_appearances = totals['plate_appearances']
+    batter.at_bats = totals['at_bats']
+    batter.hits = totals['hits']
+    batter.total_bases = totals['total_bases']
+    batter.walks = totals['walks']
+    batter.strikeouts = totals['strikeouts']
+    batter.contacts = totals['contacts']
+    batter.avg_exit_velocity = totals['exit_velocity']
+    batter.avg_launch_angle = totals['launch_angle']
+    batter.max_exit_velocity = max_exit_velocity
+    batter.plate_zones_avg = np.array(zone_counts, dtype=float)
+    return batter
+
+
+def plate_zone_rates(counts):
+    """
+    Turn plate zone counters into AVG, SLG, avg exit velocity and whiff rate per zone.
+
+    Args:
+        counts (np.ndarray): (..., zones, 10) plate_zones_avg counters, any number of leading batters.
+
+    Returns:
+        np.ndarray: (..., zones, 4) rates, 0 where a zone has nothing to divide by.
+    """
+    # AVG = hits / at bats, SLG = total bases / at bats, EV = summed exit velo / in play, whiff = whiffs / swings
+    numerators = np.stack([counts[..., 4], counts[..., 5], counts[..., 8], counts[..., 3]], axis=-1)
+    denominators = np.stack([counts[..., 1], counts[..., 1], counts[..., 9], counts[..., 3] + counts[..., 2]], axis=-1)
+    return np.divide(numerators, denominators, out=np.zeros_like(numerators), where=denominators > 0)
+
 
 def filter_pitch_data(data, pitch_type=None, min_velocity=None):
     """
@@ -436,9 +1158,14 @@ def create_player_stats_bar_chart(stats_df, selected_batter):
       
     The y-axis is scaled to accommodate rate stats (typically between 0 and 1).
     """
+    import plotly.graph_objects as go
+
     try:
-        # Filter the stats for the selected batter
-        batter_stats = stats_df[stats_df['name'] == selected_batter]
+        # Filter the stats for the selected batter, roster_stats frames are indexed by name
+        if stats_df.index.name == 'name':
+            batter_stats = stats_df.loc[[selected_batter]] if selected_batter in stats_df.index else stats_df.iloc[:0]
+        else:
+            batter_stats = stats_df[stats_df['name'] == selected_batter]
         if batter_stats.empty:
             return {
                 'data': [],
@@ -518,72 +1245,356 @@ def create_player_stats_bar_chart(stats_df, selected_batter):
 
 
 
+class ZoneGrid:
+    """
+    Layout of the plate zones behind the zone counters and the strike zone plot.
+
+    A rows x cols grid over the strike zone (or any box, e.g. PLOT_AREA for a fine
+    heat map), optionally wrapped in a shadow ring `shadow` feet wide. Zone 0 is
+    everything outside, 1 to rows * cols are the grid cells left to right, top row
+    first, and the ring cells come after them in the same reading order. The
+    default 4x4 grid without a ring gives the original 17 zones.
+
+    Edges are inclusive: the box keeps pitches on its border, a pitch on a vertical
+    grid line goes to the left cell and one on a horizontal grid line to the lower cell.
+    """
+    def __init__(self, rows=4, cols=4, shadow=0.0, bounds=None):
+        """
+        Args:
+            rows (int): Grid rows.
+            cols (int): Grid columns.
+            shadow (float): Width of the ring around the box in feet, 0 for no ring.
+            bounds (tuple): (left, right, bottom, top) of the box in feet, defaults to the strike zone.
+        """
+        if bounds is None:
+            bounds = (-ZONE_WIDTH / 2, ZONE_WIDTH / 2, ZONE_HEIGHT_LOW, ZONE_HEIGHT_HIGH)
+        left, right, bottom, top = bounds
+        self.rows = int(rows)
+        self.cols = int(cols)
+        self.shadow = float(shadow)
+        self.bounds = (left, right, bottom, top)
+        self.key = (self.rows, self.cols, self.shadow, self.bounds)
+
+        # cell edges left to right and top to bottom, the order zones are numbered in
+        self.x_edges = np.linspace(left, right, self.cols + 1)
+        self.y_edges = np.linspace(top, bottom, self.rows + 1)
+        self.grid_zones = self.rows * self.cols
+        cells = [(self.x_edges[col], self.x_edges[col + 1], self.y_edges[row], self.y_edges[row + 1])
+                 for row in range(self.rows) for col in range(self.cols)]
+
+        self._ring_x = self._ring_y = self._ring_zones = None
+        if self.shadow > 0:
+            # the box edges plus one ring cell on every side, every ring cell
+            # (corners included) gets a zone number after the grid's
+            self._ring_x = np.concatenate([[left - self.shadow], self.x_edges, [right + self.shadow]])
+            ring_y = np.concatenate([[top + self.shadow], self.y_edges, [bottom - self.shadow]])
+            self._ring_y = ring_y[::-1]
+            ring_zones = np.zeros((self.rows + 2, self.cols + 2), dtype=np.intp)
+            zone = self.grid_zones + 1
+            for row in range(self.rows + 2):
+                for col in range(self.cols + 2):
+                    if row in (0, self.rows + 1) or col in (0, self.cols + 1):
+                        ring_zones[row, col] = zone
+                        cells.append((self._ring_x[col], self._ring_x[col + 1], ring_y[row], ring_y[row + 1]))
+                        zone += 1
+            self._ring_zones = ring_zones.ravel()
+
+        # (x0, x1, y_top, y_bottom) of zones 1, 2, ... for drawing
+        self.cells = cells
+        self.zone_count = len(cells) + 1  # rows of the zone matrices, zone 0 included
+
+    def __eq__(self, other):
+        return isinstance(other, ZoneGrid) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        ring = f", shadow={self.shadow}" if self.shadow else ""
+        return f"ZoneGrid({self.rows}x{self.cols}{ring})"
+
+    def zone_numbers(self, x, y):
+        """
+        Bin pitch locations into zones in one call.
+
+        Args:
+            x (array-like): PlateLocSide values in feet.
+            y (array-like): PlateLocHeight values in feet.
+
+        Returns:
+            np.ndarray: Zone number for every pitch, 0 outside (NaN locations included).
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        # reversed top-down edges so boundaries land on exactly the same floats as the plot
+        x_edges, y_edges = self.x_edges, self.y_edges[::-1]
+        rows, cols = self.rows, self.cols
+
+        col = np.clip(np.searchsorted(x_edges, x, side='left') - 1, 0, cols - 1)
+        row = rows - 1 - np.clip(np.searchsorted(y_edges, y, side='left') - 1, 0, rows - 1)
+        in_box = (x >= x_edges[0]) & (x <= x_edges[-1]) & (y >= y_edges[0]) & (y <= y_edges[-1])
+        zones = np.where(in_box, row * cols + col + 1, 0)
+        if self._ring_zones is None:
+            return zones
+
+        # anything outside the box but inside the ring's outer edge lands on a ring cell
+        col = np.clip(np.searchsorted(self._ring_x, x, side='left') - 1, 0, cols + 1)
+        row = rows + 1 - np.clip(np.searchsorted(self._ring_y, y, side='left') - 1, 0, rows + 1)
+        in_ring = (~in_box & (x >= self._ring_x[0]) & (x <= self._ring_x[-1])
+                   & (y >= self._ring_y[0]) & (y <= self._ring_y[-1]))
+        return np.where(in_ring, self._ring_zones[row * (cols + 2) + col], zones)
+
+
+# the original 4x4 strike zone grid, what every Batter uses unless told otherwise
+DEFAULT_ZONE_GRID = ZoneGrid()
+
+# the whole strike zone plot, for fine grids over every pitch location
+PLOT_AREA = (-2.0, 2.0, 0.0, 5.0)
+
+
+def parse_zone_grid(text, shadow=0.0, area="zone"):
+    """
+    Build a ZoneGrid from command line values.
+
+    Args:
+        text (str): "ROWSxCOLS", e.g. "4x4" or "12x12".
+        shadow (float): Shadow ring width in feet.
+        area (str): "zone" for a grid over the strike zone, "plot" for the whole plot area.
+
+    Returns:
+        ZoneGrid: The grid, DEFAULT_ZONE_GRID when it matches the default.
+    """
+    rows, _, cols = text.lower().partition("x")
+    if int(rows) < 1 or int(cols or rows) < 1:
+        raise ValueError(f"zone grid needs at least one row and column: {text!r}")
+    grid = ZoneGrid(int(rows), int(cols or rows), shadow, PLOT_AREA if area == "plot" else None)
+    return DEFAULT_ZONE_GRID if grid == DEFAULT_ZONE_GRID else grid
+
+
+def get_zone_numbers(x, y, zone_width, zone_height_low, zone_height_high):
+    """
+    Bin pitch locations into the 4x4 strike zone grid in one call.
+
+    Zones are numbered 1-16 left to right, top row first, and 0 means the pitch
+    missed the zone (NaN locations included). See ZoneGrid for other grids.
+
+    Args:
+        x (array-like): PlateLocSide values in feet.
+        y (array-like): PlateLocHeight values in feet.
+        zone_width (float): Strike zone width in feet.
+        zone_height_low (float): Bottom of the zone in feet.
+        zone_height_high (float): Top of the zone in feet.
+
+    Returns:
+        np.ndarray: Zone number for every pitch.
+    """
+    if (zone_width, zone_height_low, zone_height_high) == (ZONE_WIDTH, ZONE_HEIGHT_LOW, ZONE_HEIGHT_HIGH):
+        return DEFAULT_ZONE_GRID.zone_numbers(x, y)
+    return ZoneGrid(bounds=(-zone_width / 2, zone_width / 2, zone_height_low, zone_height_high)).zone_numbers(x, y)
+
+
 def get_zone_number(x, y, zone_width, zone_height_low, zone_height_high):
-    x_sections = np.linspace(-zone_width/2, zone_width/2, 5)
-    y_sections = np.linspace(zone_height_high, zone_height_low, 5)
-
-    zone_num = 0
-    for row in range(4):
-        for col in range(4):
-            x_min, x_max = x_sections[col], x_sections[col+1]
-            y_max, y_min = y_sections[row], y_sections[row+1]
-            if (x_min <= x <= x_max) and (y_min <= y <= y_max):
-                zone_num = row * 4 + col + 1
-                break
-    return zone_num
-
-def create_strike_zone_plot(data, title, batter, zone_stat_index, show_pitches):
+    return int(get_zone_numbers(x, y, zone_width, zone_height_low, zone_height_high))
+
+
+# big plots (team or pitcher seasons) draw pitches with WebGL above WEBGL_PITCHES
+# pitches, and above BINNED_PITCHES send one marker per location bin instead of
+# one per pitch, plus a random PITCH_SAMPLE of the raw pitches for hover detail
+WEBGL_PITCHES = 2_000
+BINNED_PITCHES = 20_000
+PITCH_BINS = 40  # square bins across the plotted width, 0.1 ft over the whole plot
+PITCH_SAMPLE = 5_000
+
+PITCH_HOVER = (
+    "Outcome: %{customdata[0]}<br>"
+    "EV: %{customdata[1]:.1f}  LA: %{customdata[2]:.1f}<br>"
+    "Pitch Type: %{customdata[3]}<br>"
+    "Speed: %{customdata[4]:.1f} mph<br>"
+    "Spin: %{customdata[5]:.0f} rpm<br>"
+    "Zone: %{customdata[6]}"
+    "<extra></extra>"
+)
+BIN_HOVER = (
+    "Pitches: %{customdata[0]}<br>"
+    "Top Outcome: %{customdata[1]} (%{customdata[2]:.0%})<br>"
+    "Top Pitch Type: %{customdata[3]}<br>"
+    "Avg EV: %{customdata[4]:.1f}<br>"
+    "Avg Speed: %{customdata[5]:.1f} mph<br>"
+    "Avg Spin: %{customdata[6]:.0f} rpm<br>"
+    "Zone: %{customdata[7]}"
+    "<extra></extra>"
+)
+PITCH_COLUMNS = ['outcome', 'exit_Velocity', 'launch_angle', 'pitch_type', 'rel_Speed', 'spin_rate', 'Zone']
+
+
+def bin_pitches(data, area=PLOT_AREA, bins=PITCH_BINS, grid=None):
+    """
+    Summarize pitches per square location bin, for plots with too many pitches to draw one by one.
+
+    Args:
+        data (pd.DataFrame): The create_strike_zone_plot columns (PlateLocSide,
+            PlateLocHeight, outcome, pitch_type, exit_Velocity, rel_Speed, spin_rate).
+        area (tuple): (left, right, bottom, top) in feet, pitches outside it are left out.
+        bins (int): Bins across the width of the area.
+        grid (ZoneGrid): Zone numbers of the bins, defaults to the 4x4 strike zone grid.
+
+    Returns:
+        pd.DataFrame: One row per bin with pitches in it: PlateLocSide and
+        PlateLocHeight (mean location), pitches, top_outcome, top_outcome_share,
+        top_pitch_type, exit_Velocity (mean of balls hit, NaN if none),
+        rel_Speed, spin_rate (means) and Zone.
+    """
+    grid = grid if grid is not None else DEFAULT_ZONE_GRID
+    left, right, bottom, top = area
+    size = (right - left) / bins
+    x = data['PlateLocSide'].to_numpy(dtype=float)
+    y = data['PlateLocHeight'].to_numpy(dtype=float)
+    inside = (x >= left) & (x < right) & (y >= bottom) & (y < top)
+    frame = pd.DataFrame({
+        'bin': (np.floor((y[inside] - bottom) / size).astype(np.int64) * bins
+                + np.floor((x[inside] - left) / size).astype(np.int64)),
+        'PlateLocSide': x[inside],
+        'PlateLocHeight': y[inside],
+        'outcome': data['outcome'].to_numpy()[inside],
+        'pitch_type': data['pitch_type'].to_numpy()[inside],
+        # no exit velocity and 0.0 (filled in by create_strike_zone_plot) both mean no ball in play
+        'exit_Velocity': pd.to_numeric(data['exit_Velocity'], errors='coerce').to_numpy(dtype=float)[inside],
+        'rel_Speed': pd.to_numeric(data['rel_Speed'], errors='coerce').to_numpy(dtype=float)[inside],
+        'spin_rate': pd.to_numeric(data['spin_rate'], errors='coerce').to_numpy(dtype=float)[inside],
+    })
+    frame.loc[frame['exit_Velocity'] <= 0, 'exit_Velocity'] = np.nan
+
+    grouped = frame.groupby('bin', sort=True)
+    summary = grouped.agg(PlateLocSide=('PlateLocSide', 'mean'), PlateLocHeight=('PlateLocHeight', 'mean'),
+                          pitches=('PlateLocSide', 'size'), exit_Velocity=('exit_Velocity', 'mean'),
+                          rel_Speed=('rel_Speed', 'mean'), spin_rate=('spin_rate', 'mean'))
+    for column in ('outcome', 'pitch_type'):
+        # most common value per bin, ties go to the value seen first
+        counts = frame.groupby(['bin', column], sort=False).size()
+        top = counts.groupby(level=0).idxmax()
+        summary[f'top_{column}'] = [value for _, value in top.reindex(summary.index)]
+        if column == 'outcome':
+            summary['top_outcome_share'] = counts.groupby(level=0).max().reindex(summary.index) / summary['pitches']
+    summary['Zone'] = grid.zone_numbers(summary['PlateLocSide'], summary['PlateLocHeight'])
+    return summary.reset_index(drop=True)
+
+
+def pitch_location_traces(data, show_pitches, grid=None, area=PLOT_AREA):
+    """
+    The pitch marker traces of a strike zone plot, sized for how many pitches there are.
+
+    Up to WEBGL_PITCHES pitches get one SVG marker each, up to BINNED_PITCHES
+    one WebGL (Scattergl) marker each, both with the full per-pitch hover. Above
+    that the 'Pitches' trace has one marker per bin_pitches bin, sized and
+    colored by its pitch count, with a hover summary of the bin, and a hidden
+    'Pitch Sample' trace has PITCH_SAMPLE of the pitches with the full hover
+    (click it in the legend, or zoom in on the dashboard for every pitch).
+
+    Args:
+        data (pd.DataFrame): The create_strike_zone_plot columns, Zone included.
+        show_pitches (bool): Show the 'Pitches' trace, otherwise it is only in the legend.
+        grid (ZoneGrid): Zone numbers of the bins.
+        area (tuple): (left, right, bottom, top) in feet the bins cover, the shown axis ranges.
+
+    Returns:
+        list: Plotly traces.
+    """
+    import plotly.graph_objects as go
+
+    visible = True if show_pitches else 'legendonly'
+    if len(data) <= BINNED_PITCHES:
+        scatter = go.Scattergl if len(data) > WEBGL_PITCHES else go.Scatter
+        return [scatter(
+            x=data['PlateLocSide'],
+            y=data['PlateLocHeight'],
+            mode='markers',
+            name='Pitches',
+            marker=dict(
+                size=8,
+                color='blue',
+                opacity=0.6
+            ),
+            hovertemplate=PITCH_HOVER,
+            customdata=data[PITCH_COLUMNS].values,
+            visible=visible
+        )]
+
+    bins = bin_pitches(data, area, PITCH_BINS, grid)
+    binned = go.Scattergl(
+        x=bins['PlateLocSide'],
+        y=bins['PlateLocHeight'],
+        mode='markers',
+        name='Pitches',
+        marker=dict(
+            # area grows with the pitch count, so the busiest bin is 18px across
+            size=np.maximum(3.0, 18 * np.sqrt(bins['pitches'] / bins['pitches'].max())),
+            color=bins['pitches'],
+            colorscale='Blues',
+            cmin=0,
+            opacity=0.8,
+            showscale=False
+        ),
+        hovertemplate=BIN_HOVER,
+        customdata=bins[['pitches', 'top_outcome', 'top_outcome_share', 'top_pitch_type', 'exit_Velocity',
+                         'rel_Speed', 'spin_rate', 'Zone']].values,
+        visible=visible
+    )
+    # fixed seed, so the same pitches give the same figure (and cache entry) every time
+    sample = np.sort(np.random.default_rng(0).choice(len(data), PITCH_SAMPLE, replace=False))
+    sampled = data.iloc[sample]
+    raw = go.Scattergl(
+        x=sampled['PlateLocSide'],
+        y=sampled['PlateLocHeight'],
+        mode='markers',
+        name='Pitch Sample',
+        marker=dict(
+            size=5,
+            color='navy',
+            opacity=0.6
+        ),
+        hovertemplate=PITCH_HOVER,
+        customdata=sampled[PITCH_COLUMNS].values,
+        visible='legendonly'
+    )
+    return [binned, raw]
+
+
+def create_strike_zone_plot(data, title, batter, zone_stat_index, show_pitches, grid=None):
+    """
+    Strike zone figure: the pitches plus each plate zone colored and labeled by a zone stat.
+
+    The zones follow grid, defaulting to the batter's grid (the 4x4 strike zone
+    grid for batters built without one). A shadow ring is outlined with a dotted line.
+    """
+    import plotly.graph_objects as go
     
     def get_color_gradient(value, min_val, max_val, base_color='red', reverse=False):
         norm = (value - min_val) / (max_val - min_val + 1e-9)
         if base_color == 'blue':
-            color_map = plt.cm.Blues
+            color_map = 'Blues'
         else:
-            color_map = plt.cm.Reds
+            color_map = 'Reds'
             norm = 1 - norm if reverse else norm
-        rgba = color_map(norm)
+        rgba = colormap_rgb(color_map, norm)
         return f'rgba({int(rgba[0]*255)}, {int(rgba[1]*255)}, {int(rgba[2]*255)}, 0.5)'
 
     try:
         zone_width = 17 * 0.0833
         zone_height_low = 1.5
         zone_height_high = 3.5
+        if grid is None:
+            grid = getattr(batter, 'grid', DEFAULT_ZONE_GRID)
+        left, right, bottom, top = grid.bounds
 
-        data['Zone'] = data.apply(lambda row: get_zone_number(
-            row['PlateLocSide'], 
-            row['PlateLocHeight'],
-            zone_width,
-            zone_height_low,
-            zone_height_high
-        ), axis=1)
+        data['Zone'] = grid.zone_numbers(data['PlateLocSide'], data['PlateLocHeight'])
 
         if 'exit_Velocity' in data.columns:
             data['exit_Velocity'] = data['exit_Velocity'].fillna(0.0)
         if 'launch_angle' in data.columns:
             data['launch_angle'] = data['launch_angle'].fillna(0.0)
 
-        pitch_locations = go.Scatter(
-            x=data['PlateLocSide'],
-            y=data['PlateLocHeight'],
-            mode='markers',
-            name='Pitches',
-            marker=dict(
-                size=8,
-                color='blue',
-                opacity=0.6
-            ),
-            hovertemplate=(
-                "Outcome: %{customdata[0]}<br>"
-                "EV: %{customdata[1]:.1f}  LA: %{customdata[2]:.1f}<br>"
-                "Pitch Type: %{customdata[3]}<br>"
-                "Speed: %{customdata[4]:.1f} mph<br>"
-                "Spin: %{customdata[5]:.0f} rpm<br>"
-                "Zone: %{customdata[6]}"
-                "<extra></extra>"
-            ),
-            customdata=data[['outcome', 'exit_Velocity', 'launch_angle', 'pitch_type', 'rel_Speed', 'spin_rate', 'Zone']].values,
-            visible='legendonly' if not show_pitches else True
-        )
+        # WebGL and binned above WEBGL_PITCHES / BINNED_PITCHES pitches
+        pitch_locations = pitch_location_traces(data, show_pitches, grid)
 
         strike_zone = go.Scatter(
             x=[-zone_width/2, -zone_width/2, zone_width/2, zone_width/2, -zone_width/2],
@@ -595,12 +1606,12 @@ def create_strike_zone_plot(data, title, batter, zone_stat_index, show_pitches):
         )
 
         vertical_lines = []
-        x_steps = np.linspace(-zone_width/2, zone_width/2, 5)
+        x_steps = np.linspace(left, right, grid.cols + 1)
         for x in x_steps[1:-1]:
             vertical_lines.append(
                 go.Scatter(
                     x=[x, x],
-                    y=[zone_height_low, zone_height_high],
+                    y=[bottom, top],
                     mode='lines',
                     line=dict(color='gray', width=1, dash='dash'),
                     showlegend=False,
@@ -609,11 +1620,11 @@ def create_strike_zone_plot(data, title, batter, zone_stat_index, show_pitches):
             )
 
         horizontal_lines = []
-        y_steps = np.linspace(zone_height_low, zone_height_high, 5)
+        y_steps = np.linspace(bottom, top, grid.rows + 1)
         for y in y_steps[1:-1]:
             horizontal_lines.append(
                 go.Scatter(
-                    x=[-zone_width/2, zone_width/2],
+                    x=[left, right],
                     y=[y, y],
                     mode='lines',
                     line=dict(color='gray', width=1, dash='dash'),
@@ -622,6 +1633,18 @@ def create_strike_zone_plot(data, title, batter, zone_stat_index, show_pitches):
                 )
             )
 
+        shadow_ring = []
+        if grid.shadow:
+            x0, x1, y0, y1 = left - grid.shadow, right + grid.shadow, bottom - grid.shadow, top + grid.shadow
+            shadow_ring.append(go.Scatter(
+                x=[x0, x0, x1, x1, x0],
+                y=[y0, y1, y1, y0, y0],
+                mode='lines',
+                name='Shadow Zone',
+                line=dict(color='gray', width=1, dash='dot'),
+                hoverinfo='none'
+            ))
+
         layout = dict(
             title=title,
             xaxis=dict(
@@ -647,26 +1670,22 @@ def create_strike_zone_plot(data, title, batter, zone_stat_index, show_pitches):
 
         if zone_stat_index is not None and batter is not None:
             zone_annotations = []
-            x_sections = np.linspace(-zone_width / 2, zone_width / 2, 5)
-            y_sections = np.linspace(zone_height_high, zone_height_low, 5)
-            z_num = 1
-            for row in range(4):
-                for col in range(4):
-                    x_center = (x_sections[col] + x_sections[col + 1]) / 2
-                    y_center = (y_sections[row] + y_sections[row + 1]) / 2
-                    if z_num in batter.plate_zone_stats:
-                        stat_value = float('{:.3g}'.format(batter.plate_zone_stats[z_num][zone_stat_index]))
-                        zone_annotations.append(dict(
-                            x=x_center,
-                            y=y_center,
-                            text=str(round(stat_value, 3)),
-                            showarrow=False,
-                            font=dict(color='black')
-                        ))
-                    z_num += 1
+            # grid cells first (left to right, top row first), then the shadow ring
+            for z_num, (x0, x1, y0, y1) in enumerate(grid.cells, start=1):
+                x_center = (x0 + x1) / 2
+                y_center = (y0 + y1) / 2
+                if z_num < len(batter.plate_zone_stats):
+                    stat_value = float('{:.3g}'.format(batter.plate_zone_stats[z_num][zone_stat_index]))
+                    zone_annotations.append(dict(
+                        x=x_center,
+                        y=y_center,
+                        text=str(round(stat_value, 3)),
+                        showarrow=False,
+                        font=dict(color='black')
+                    ))
             layout['annotations'] = layout.get('annotations', []) + zone_annotations
 
-            stat_values = [batter.plate_zone_stats.get(z, [0]*7)[zone_stat_index] for z in range(1, 17)]
+            stat_values = [batter.plate_zone_stats[z][zone_stat_index] for z in range(1, len(grid.cells) + 1)]
             min_val = min(stat_values)
             max_val = max(stat_values)
             use_blue = (zone_stat_index == 3)
@@ -674,13 +1693,7 @@ def create_strike_zone_plot(data, title, batter, zone_stat_index, show_pitches):
             reverse = False
 
             layout.setdefault("shapes", [])
-            for i, stat in enumerate(stat_values):
-                row = i // 4
-                col = i % 4
-                x0 = x_sections[col]
-                x1 = x_sections[col + 1]
-                y0 = y_sections[row]
-                y1 = y_sections[row + 1]
+            for stat, (x0, x1, y0, y1) in zip(stat_values, grid.cells):
                 color = get_color_gradient(stat, min_val, max_val, base_color=base_color)
                 layout['shapes'].append(dict(
                     type="rect",
@@ -692,7 +1705,7 @@ def create_strike_zone_plot(data, title, batter, zone_stat_index, show_pitches):
                     layer="below"
                 ))
 
-        all_traces = [strike_zone] + vertical_lines + horizontal_lines + [pitch_locations]
+        all_traces = [strike_zone] + vertical_lines + horizontal_lines + shadow_ring + pitch_locations
         return {
             'data': all_traces,
             'layout': layout
@@ -720,95 +1733,207 @@ def create_strike_zone_plot(data, title, batter, zone_stat_index, show_pitches):
 
 
 
-def create_strike_zone_plot_from_pitches(batter, has_outcome, type_pitches,velo_min, velo_max, spin_min, spin_max, create_json, create_barchart, title, zone_stat_index, show_pitches):
+def filter_batter(batter, has_outcome, type_pitches, velo_min, velo_max, spin_min, spin_max, grid=None,
+                  exact_type=False):
+    """
+    Build a "Custom" batter from the pitches of a batter that match a filter.
+
+    The filter is answered from the batter's precomputed PitchQuery indexes and
+    the custom batter is filled straight from the matching rows, so no pitch is
+    replayed through add_pitch. Results are cached per filter combination.
+    The zone counters use grid, defaulting to the batter's own grid. With
+    exact_type, "Four-Seam" only picks four-seams, not cutters and sinkers
+    (see PitchQuery.mask).
+
+    Returns:
+        Batter: Custom batter with calculate_stats already run.
+    """
+    from pitch_query import batter_query
+    from result_cache import zone_cache
+
+    if grid is None:
+        grid = getattr(batter, 'grid', DEFAULT_ZONE_GRID)
+    query = batter_query(batter)
+    filters = (has_outcome, type_pitches, velo_min, velo_max, spin_min, spin_max)
+    stats_key = (query.fingerprint, 'stats', batter.name, grid.key, exact_type) + filters
+    custom_batter = zone_cache.get(stats_key)
+    if custom_batter is None:
+        with instrument.span("query"):
+            rows = query.select(*filters, exact_type=exact_type)
+        instrument.count("queries")
+        instrument.count("pitches_matched", len(rows))
+        custom_batter = Batter(batter.name,"Custom", grid)
+        custom_batter.add_rows(query.table, rows)
+        custom_batter.calculate_stats()
+        zone_cache.put(stats_key, custom_batter)
+    return custom_batter
+
+
+def write_batter_json(batter, type_pitches):
+    """
+    Save a batter's stats to player_jsons/<name>_vs_<pitch type>.json.
+
+    Returns:
+        str: Path of the JSON file.
+    """
+    # Ensure the folder exists
+    os.makedirs("player_jsons", exist_ok=True)
+
+    # Sanitize the file name
+    safe_name = batter.name.replace(" ", "_").replace(",", "")
+    safe_type = type_pitches.replace(" ", "_")
+    json_name = f"player_jsons/{safe_name}_vs_{safe_type}.json"
+
+    # Save JSON file
+    with open(json_name, "w") as f:
+        json.dump(batter.get_stats(), f, indent=4)
+    return json_name
+
+
+def create_strike_zone_plot_from_pitches(batter, has_outcome, type_pitches,velo_min, velo_max, spin_min, spin_max, create_json, create_barchart, title, zone_stat_index, show_pitches, grid=None, exact_type=False):
     # Checks if outcomes is false only pitches with an outcome like walk, strikeout, etc. are included
     # If outcomes is true all pitches are included
     print("Creating strike zone plot from pitches...")
-    custom_batter = Batter(batter.name,"Custom")
-    pitches_data = {"PlateLocSide": [], "PlateLocHeight": [], "pitch_type": [], "outcome": [], "exit_Velocity": [], "launch_angle": [], "rel_Speed": [], "spin_rate": []}
-    for p in batter.pitches:            
-        if (has_outcome and p.action) or (not has_outcome):
-            if type_pitches == "All" or p.pitch_type == type_pitches or (
-                type_pitches == "Four-Seam" and p.pitch_type in {"Cutter", "Sinker"}):
-
-                if(p.rel_speed >= velo_min and p.rel_speed <= velo_max) or (velo_max and velo_min == 0):
-                    if( p.spin_rate >= spin_min and p.spin_rate <= spin_max) or (spin_max and spin_min == 0):
-
-                        pitches_data["PlateLocSide"].append(p.plateLocSide)
-                        pitches_data["PlateLocHeight"].append(p.plateLocHeight)
-                        pitches_data["pitch_type"].append(p.pitch_type)
-                        pitches_data["outcome"].append(p.outcome)
-                        pitches_data["exit_Velocity"].append(p.exit_velocity)
-                        pitches_data["launch_angle"].append(p.launch_angle)
-                        pitches_data["rel_Speed"].append(p.rel_speed)
-                        pitches_data["spin_rate"].append(p.spin_rate)
-
-                        custom_batter.add_pitch(p)
-               
-    custom_batter.calculate_stats()
+    import plotly.io as pio
+    from pitch_query import batter_query
+    from result_cache import zone_cache
+
+    query = batter_query(batter)
+    # exact_type: "Four-Seam" without cutters and sinkers, see PitchQuery.mask
+    custom_batter = filter_batter(batter, has_outcome, type_pitches, velo_min, velo_max, spin_min, spin_max, grid,
+                                  exact_type)
     # print(len(custom_batter.pitches))  
 
-    data = pd.DataFrame(pitches_data)
     if create_barchart:
         # uncomment to output barchart
         bar_chart = create_player_stats_bar_chart(
             pd.DataFrame([custom_batter.get_stats()]), 
             custom_batter.name
         )
-        pio.write_html(bar_chart, 'barchart.html', auto_open=True)
+        with instrument.span("write_html"):
+            pio.write_html(bar_chart, 'barchart.html', auto_open=True)
 
     if create_json:
-        # Ensure the folder exists
-        os.makedirs("player_jsons", exist_ok=True)
-
-        # Sanitize the file name
-        safe_name = custom_batter.name.replace(" ", "_").replace(",", "")
-        safe_type = type_pitches.replace(" ", "_")
-        json_name = f"player_jsons/{safe_name}_vs_{safe_type}.json"
+        write_batter_json(custom_batter, type_pitches)
+
+    figure_key = (query.fingerprint, 'figure', batter.name, has_outcome, type_pitches, velo_min, velo_max,
+                  spin_min, spin_max, title, zone_stat_index, show_pitches, custom_batter.grid.key, exact_type)
+    figure = zone_cache.get(figure_key)
+    if figure is None:
+        data = query.plot_frame(custom_batter.pitches.rows)
+        # Pass extra parameters
+        with instrument.span("create_strike_zone_plot"):
+            figure = create_strike_zone_plot(data, title, batter=custom_batter, zone_stat_index=zone_stat_index, show_pitches=show_pitches)
+        instrument.count("figures_built")
+        zone_cache.put(figure_key, figure)
+    return figure
+
+
+def parse_args(argv=None):
+    # defaults are the old hard-coded values of main(), they include every pitch
+    parser = argparse.ArgumentParser(description="Strike zone plot and stats for one batter.")
+    parser.add_argument("--csv", default="Regular Season Master CSV.csv", help="master CSV file")
+    parser.add_argument("--batter", default="Entrekin, Jake", help='batter name, "Last, First"')
+    parser.add_argument("--role", default="general", help="role given to the batter")
+    parser.add_argument("--type-pitches", default="All",
+                        help='"All", "Fastball", "Curveball", "Slider", "Changeup" - sinker & cutter included with fastball')
+    parser.add_argument("--velo-min", type=float, default=0)
+    parser.add_argument("--velo-max", type=float, default=200)
+    parser.add_argument("--spin-min", type=float, default=0)
+    parser.add_argument("--spin-max", type=float, default=4000)
+    parser.add_argument("--has-outcome", action="store_true",
+                        help="only pitches with an outcome like walk, strikeout, etc.")
+    parser.add_argument("--zone-stat", type=int, default=2,
+                        help="zone stat to color by: 0 batting average, 1 slugging, 2 avg exit velocity, 3 whiff rate")
+    parser.add_argument("--zone-grid", default="4x4", metavar="ROWSxCOLS", help="plate zone grid, e.g. 3x3 or 12x12")
+    parser.add_argument("--shadow", type=float, default=0.0, metavar="FEET",
+                        help="add a shadow/chase ring this wide around the zone grid")
+    parser.add_argument("--grid-area", choices=["zone", "plot"], default="zone",
+                        help="lay the zone grid over the strike zone or the whole plot")
+    parser.add_argument("--title", default="Pitch Location Plot")
+    parser.add_argument("--hide-pitches", action="store_true", help="only zone colors and metrics, no pitch dots")
+    parser.add_argument("--stats-only", action="store_true", help="print the filtered stats as JSON, no plots")
+    parser.add_argument("--json-only", action="store_true", help="write the filtered stats to player_jsons/, no plots")
+    parser.add_argument("--json", action="store_true", help="also write the filtered stats to player_jsons/")
+    parser.add_argument("--chunksize", type=int, metavar="ROWS",
+                        help="with --stats-only/--json-only, stream the CSV this many rows at a time")
+    parser.add_argument("--no-barchart", action="store_true", help="skip barchart.html")
+    parser.add_argument("--strikezone-html", default="strikezone.html", help="strike zone plot output file")
+    parser.add_argument("--no-open", action="store_true", help="don't open the HTML files in a browser")
+    parser.add_argument("--instrument", metavar="PATH",
+                        help='save stage timings and counters as JSON ("-" prints them)')
+    parser.add_argument("--profile", action="store_true", help="with --instrument, add the top cProfile functions")
+    parser.add_argument("--tracemalloc", action="store_true", help="with --instrument, add peak traced memory")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.instrument:
+        run(args)
+        return
+    instrument.enable(profile=args.profile, memory=args.tracemalloc)
+    try:
+        run(args)
+    finally:
+        instrument.write_summary(instrument.disable(), args.instrument)
 
-        # Save JSON file
-        with open(json_name, "w") as f:
-            json.dump(custom_batter.get_stats(), f, indent=4)
 
-    # Pass extra parameters
-    return create_strike_zone_plot(data, title, batter=custom_batter, zone_stat_index=zone_stat_index, show_pitches=show_pitches)
+def output_stats(args, batter):
+    if args.json_only:
+        print("Saved", write_batter_json(batter, args.type_pitches))
+    else:
+        print(json.dumps(batter.get_stats(), indent=4))
 
 
-def main():
+def run(args):
     print("Running main function...")
-    
-    Battername = "Entrekin, Jake"  # edit player name here, this sets the filter of who we are looking for
-    data = pd.read_csv('Regular Season Master CSV.csv')
-    player = Batter(Battername, "gerneral") # general is for basic analysis, recomend changing general to a different role to distinguish filter paramters
-
-    # Create a Pitch object from the first row
-    # Iterate through each row in the DataFrame
+    filters = (args.has_outcome, args.type_pitches, args.velo_min, args.velo_max, args.spin_min, args.spin_max)
+    grid = parse_zone_grid(args.zone_grid, args.shadow, args.grid_area)
+
+    if args.chunksize and (args.stats_only or args.json_only):
+        from season_state import stream_batter
+        # never holds more than one chunk of the CSV, for files bigger than memory
+        custom_batter = stream_batter(args.csv, args.batter, filters, args.chunksize, role="Custom", grid=grid)
+        if custom_batter is None:
+            print(f"No pitches found for {args.batter}")
+            return
+        output_stats(args, custom_batter)
+        return
+    if args.chunksize:
+        print("--chunksize only applies to --stats-only and --json-only, loading the whole CSV")
+
+    data = load_master_csv(args.csv)  # parsed once, then read from the binary cache
+    player = Batter(args.batter, args.role, grid)
     player.filter_pitches(data)
+    if not player.pitches:
+        print(f"No pitches found for {args.batter}")
+        return
     player.calculate_stats()
     # now player has data from every pitch they have seen
 
-    # filter paramteres, these will ensure all pitches are included, change as needed
-    velo_min = 0
-    velo_max = 200
-    spin_min = 0
-    spin_max = 4000
+    if args.stats_only or args.json_only:
+        # no plotting, so plotly is never imported
+        output_stats(args, filter_batter(player, *filters))
+        return
 
+    import plotly.io as pio
 
     str_fig = create_strike_zone_plot_from_pitches(
-        player, 
-        has_outcome=False, # when true only pitches with an outcome like walk, strikeout, etc. are included, false is all pitches
-        type_pitches="All", # "All", "Fastball", "Curveball", "Slider", "Changeup" - sinker & cutter included with fastball
-        velo_min= velo_min,
-        velo_max= velo_max,
-        spin_min= spin_min,
-        spin_max = spin_max, 
-        create_json=False,  # saves all batter data to a json file
-        create_barchart=True, #creates a barchart to display batter stats
-        title="Pitch Location Plot",  # arbitrary name
-        zone_stat_index=2,       # 0 indicates batting average, 1 for slugging, 2 for avg exit velocity,4 for whiff rate
-        show_pitches=True      # shows the dots for each pitch if true, only has color and zone metrics if false
+        player, *filters,
+        create_json=args.json,
+        create_barchart=False,
+        title=args.title,
+        zone_stat_index=args.zone_stat,
+        show_pitches=not args.hide_pitches
     )
-    pio.write_html(str_fig, 'strikezone.html', auto_open=True)
+    if not args.no_barchart:
+        custom_batter = filter_batter(player, *filters)
+        bar_chart = create_player_stats_bar_chart(pd.DataFrame([custom_batter.get_stats()]), custom_batter.name)
+        with instrument.span("write_html"):
+            pio.write_html(bar_chart, 'barchart.html', auto_open=not args.no_open)
+    with instrument.span("write_html"):
+        pio.write_html(str_fig, args.strikezone_html, auto_open=not args.no_open)
    
     
 if __name__ == "__main__":
@@ -818,4 +1943,6 @@ if __name__ == "__main__":
 # you may need to create a virtual environment and install the required packages
 #   python -m venv venv    in the terminal to create the enviornment with this commmand
 #   .\venv\Scripts\activate       run this to activate the enviorment
-#   python src/backend/visualizations/barchart.py    use this command to run the script, may need to change path to file once its in your directory
\ No newline at end of file
+#   python src/backend/visualizations/barchart.py    use this command to run the script, may need to change path to file once its in your directory
+#   python barchart.py --batter "Entrekin, Jake" --type-pitches Slider --zone-stat 0    pick the batter and filters
+#   python barchart.py --batter "Entrekin, Jake" --stats-only    just print the stats, no plots
\ No newline at end of file
@@ -0,0 +1,159 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from barchart import (Batter, PitchTable, create_player_stats_bar_chart, create_strike_zone_plot_from_pitches,
+                      filter_batter, roster_stats)
+from csv_cache import load_master_csv
+from report_writer import ReportBook, write_figure, write_plotly_js
+
+# filter that keeps every pitch, same as the defaults in barchart.main
+ALL_VELO = (0, 200)
+ALL_SPIN = (0, 4000)
+
+# per worker process: the parent's table, memory-mapped once by _init_worker
+_worker = {}
+
+
+def safe_name(name):
+    """File system friendly version of a player name, "Entrekin, Jake" -> "Entrekin_Jake"."""
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in name.replace(", ", "_")).strip("_")
+
+
+def _init_worker(table_dir):
+    # every worker maps the table the parent saved, nothing is parsed or classified again
+    _worker['table'] = PitchTable.load(table_dir)
+
+
+def pitch_type_splits(batter):
+    """"All" plus every pitch type the batter has seen, in the order first seen."""
+    table, rows = batter.pitches.table, batter.pitches.rows
+    codes = table.codes('pitch_type', rows)
+    seen = pd.unique(codes[codes >= 0])
+    return ["All"] + [table.frame['pitch_type'].cat.categories[c] for c in seen]
+
+
+def split_figures(batter, split, zone_stat_index=2, show_pitches=True):
+    """The strike zone plot and stats bar chart of a batter for one pitch type split."""
+    zone_fig = create_strike_zone_plot_from_pitches(
+        batter, has_outcome=False, type_pitches=split,
+        velo_min=ALL_VELO[0], velo_max=ALL_VELO[1], spin_min=ALL_SPIN[0], spin_max=ALL_SPIN[1],
+        create_json=False, create_barchart=False,
+        title=f"{batter.name} - {split} Pitches", zone_stat_index=zone_stat_index, show_pitches=show_pitches)
+    custom_batter = filter_batter(batter, False, split, *ALL_VELO, *ALL_SPIN)
+    bar_chart = create_player_stats_bar_chart(pd.DataFrame([custom_batter.get_stats()]), custom_batter.name)
+    return zone_fig, bar_chart
+
+
+def write_batter_reports(name, rows, out_dir, plotlyjs_path, combined=False):
+    """
+    Write the strike zone plot and stats bar chart of one batter for every pitch type split.
+
+    Runs inside a worker process, building only this batter from the table
+    mapped by _init_worker. Every page loads the shared plotly.js instead of
+    embedding its own copy.
+
+    Args:
+        name (str): Batter name.
+        rows (np.ndarray): The batter's row positions in the table.
+        out_dir (str): Report folder.
+        plotlyjs_path (str): Shared plotly.min.js, see report_writer.write_plotly_js.
+        combined (bool): One paginated out_dir/<batter>.html with a page per split
+            instead of a folder with two files per split.
+
+    Returns:
+        tuple: (batter name, list of files written)
+    """
+    batter = Batter(name, "general")
+    batter.add_rows(_worker['table'], rows)
+    if combined:
+        path = os.path.join(out_dir, f"{safe_name(name)}.html")
+        with ReportBook(path, plotlyjs_path, title=name) as book:
+            for split in pitch_type_splits(batter):
+                book.add_page(split, split_figures(batter, split))
+        return name, [path]
+
+    folder = os.path.join(out_dir, safe_name(name))
+    os.makedirs(folder, exist_ok=True)
+    written = []
+    for split in pitch_type_splits(batter):
+        zone_fig, bar_chart = split_figures(batter, split)
+        for kind, fig in (("strikezone", zone_fig), ("barchart", bar_chart)):
+            path = os.path.join(folder, f"{kind}_{safe_name(split)}.html")
+            write_figure(fig, path, plotlyjs_path)
+            written.append(path)
+    return name, written
+
+
+def run_batch(path, out_dir="reports", workers=None, cache_dir=None, batters=None, combined=False):
+    """
+    Generate reports for every batter in the master CSV across a process pool.
+
+    The parent builds the PitchTable once (outcomes, dates and zones included)
+    and saves it to a temporary folder, see PitchTable.save. Every worker
+    memory-maps that folder, so the columns are shared between processes
+    instead of copied, and adding workers adds no CSV parses or table builds.
+    Tasks only carry a batter's row positions. Each task writes one batter's
+    reports with no browser windows opened, and all of them share a single
+    plotly.min.js in out_dir so they work offline.
+
+    Args:
+        path (str): Master CSV file.
+        out_dir (str): Reports go to out_dir/<batter>/.
+        workers (int): Worker processes, defaults to the CPU count.
+        cache_dir (str): Binary cache location, see load_master_csv.
+        batters (list): Only these batters, defaults to everyone.
+        combined (bool): One paginated HTML document per batter, see write_batter_reports.
+
+    Returns:
+        dict: Files written keyed by batter name.
+    """
+    start = time.perf_counter()
+    table = PitchTable(load_master_csv(path, cache_dir=cache_dir))
+    plotlyjs_path = write_plotly_js(out_dir)
+    roster_stats(table).to_csv(os.path.join(out_dir, "roster_stats.csv"))
+    groups = table.groups('batter_name')
+    names = [name for name in batters if name in groups] if batters else list(groups)
+    for name in set(batters or ()) - set(groups):
+        print(f"No pitches for batter {name}")
+
+    table_dir = tempfile.mkdtemp(prefix="pitch_table_")
+    results = {}
+    try:
+        table.save(table_dir)
+        del table
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(table_dir,)) as pool:
+            futures = [pool.submit(write_batter_reports, name, groups[name], out_dir, plotlyjs_path, combined)
+                       for name in names]
+            for future in as_completed(futures):
+                try:
+                    name, written = future.result()
+                except Exception as e:
+                    print(f"Error writing reports: {e}")
+                    continue
+                results[name] = written
+                print(f"[{len(results)}/{len(names)}] {name}: {len(written)} files")
+    finally:
+        shutil.rmtree(table_dir, ignore_errors=True)
+    print(f"Wrote reports for {len(results)} batters in {time.perf_counter() - start:.1f}s")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write strike zone and bar chart reports for every batter.")
+    parser.add_argument("csv", nargs="?", default="Regular Season Master CSV.csv")
+    parser.add_argument("--out", default="reports", help="output folder")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--batter", action="append", help="only this batter, can be repeated")
+    parser.add_argument("--combined", action="store_true", help="one paginated HTML file per batter")
+    args = parser.parse_args()
+    run_batch(args.csv, args.out, args.workers, batters=args.batter, combined=args.combined)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from barchart import (ZONE_WIDTH, ZONE_HEIGHT_LOW, ZONE_HEIGHT_HIGH, PLOT_AREA, PitchTable, Batter, ZoneGrid,
+                      load_batters, filter_batter, create_strike_zone_plot_from_pitches)
+from csv_cache import build_cache, load_master_csv, read_master_csv
+from result_cache import zone_cache
+
+# pitch type: (share of pitches, velo mean, velo sd, spin mean, spin sd, IVB mean, IVB sd, whiff rate on swings)
+PITCH_MIX = {
+    "Four-Seam": (0.36, 89.0, 2.2, 2250, 150, 16.0, 3.0, 0.12),
+    "Sinker": (0.12, 88.0, 2.2, 2150, 150, 8.0, 3.0, 0.10),
+    "Cutter": (0.07, 85.0, 2.0, 2350, 150, 9.0, 3.0, 0.18),
+    "Slider": (0.18, 79.0, 2.5, 2450, 200, 2.0, 3.0, 0.32),
+    "Curveball": (0.12, 74.0, 2.5, 2550, 250, -8.0, 4.0, 0.30),
+    "Changeup": (0.15, 80.0, 2.2, 1750, 200, 10.0, 3.0, 0.28),
+}
+
+# every chunk of this many rows gets its own seeded generator, so the same
+# (rows, seed) gives the same file however it is written
+GENERATOR_CHUNK = 250_000
+PITCHES_PER_GAME = 290
+SEASON_START = pd.Timestamp("2024-02-01")
+
+# 12x12 zones over the whole plot, timed against the default 4x4 grid
+FINE_GRID = ZoneGrid(12, 12, bounds=PLOT_AREA)
+
+# filters timed by the query stage, (has_outcome, type_pitches, velo_min, velo_max, spin_min, spin_max)
+BENCH_FILTERS = [
+    (False, "All", 0, 200, 0, 4000),
+    (True, "All", 0, 200, 0, 4000),
+    (False, "Four-Seam", 0, 200, 0, 4000),
+    (False, "Slider", 0, 200, 0, 4000),
+    (False, "All", 85, 95, 0, 4000),
+    (True, "Curveball", 70, 80, 2000, 3000),
+]
+
+
+def _chunk(start, rows, seed, batters, pitchers):
+    r = np.random.default_rng([seed, start // GENERATOR_CHUNK])
+    n = rows
+
+    game = (start + np.arange(n)) // PITCHES_PER_GAME
+    dates = SEASON_START + pd.to_timedelta(game // 3, unit="D")
+    game_ids = dates.strftime("%Y%m%d") + "-" + pd.Index(game).astype(str)
+
+    batter_ids = r.integers(0, batters, n)
+    pitcher_ids = r.integers(0, pitchers, n)
+
+    names = list(PITCH_MIX)
+    mix = np.array([PITCH_MIX[t] for t in names])
+    types = r.choice(len(names), n, p=mix[:, 0] / mix[:, 0].sum())
+    pitch_type = np.array(names, dtype=object)[types]
+    # pitchers throw a little harder or softer than average
+    pitcher_velo = np.random.default_rng([seed, 1 << 30]).normal(0, 1.5, pitchers)
+    speed = (r.normal(mix[types, 1], mix[types, 2]) + pitcher_velo[pitcher_ids]).round(1)
+    spin = r.normal(mix[types, 3], mix[types, 4]).round(0)
+    spin[r.random(n) < 0.01] = np.nan  # the odd pitch the radar misses
+    ivb = r.normal(mix[types, 5], mix[types, 6]).round(1)
+
+    side = r.normal(0, 0.85, n).round(3)
+    height = r.normal(2.4, 0.8, n).round(3)
+    in_zone = (np.abs(side) <= ZONE_WIDTH / 2) & (height >= ZONE_HEIGHT_LOW) & (height <= ZONE_HEIGHT_HIGH)
+
+    # swing more at strikes, whiff more at breaking balls
+    swing = r.random(n) < np.where(in_zone, 0.65, 0.30)
+    contact = r.random(n)
+    whiff = swing & (contact < mix[types, 7])
+    foul = swing & ~whiff & (contact < mix[types, 7] + 0.40)
+    in_play = swing & ~whiff & ~foul
+    hbp = ~swing & ~in_zone & (r.random(n) < 0.01)
+    call = np.select(
+        [whiff, foul & (r.random(n) < 0.6), foul, in_play, hbp, ~swing & in_zone],
+        ["StrikeSwinging", "FoulBallNotFieldable", "FoulBallFieldable", "InPlay", "HitByPitch", "StrikeCalled"],
+        "BallCalled").astype(object)
+    call[(call == "BallCalled") & (r.random(n) < 0.005)] = "BallIntentional"
+
+    # batted balls: harder hit balls at better angles turn into hits more often
+    exit_speed = np.where(in_play, r.normal(86, 14, n).clip(30, 118).round(1), np.nan)
+    angle = np.where(in_play, r.normal(12, 25, n).clip(-80, 85).round(1), np.nan)
+    hit = in_play & (r.random(n) < np.clip((exit_speed - 60) / 80, 0.05, 0.6))
+    hit_type = r.random(n)
+    home_run = hit & (exit_speed > 98) & (angle > 20) & (angle < 40)
+    play_result = np.select(
+        [home_run, hit & (hit_type < 0.70), hit & (hit_type < 0.95), hit,
+         in_play & (hit_type < 0.03), in_play],
+        ["HomeRun", "Single", "Double", "Triple", "Sacrifice", "Out"], "Undefined").astype(object)
+    tagged_hit = np.select(
+        [~in_play, (play_result == "Sacrifice") & (angle < 20), play_result == "Sacrifice",
+         angle < 10, angle < 25, angle < 50],
+        ["Undefined", "Bunt", "FlyBall", "GroundBall", "LineDrive", "FlyBall"], "Popup").astype(object)
+
+    # the last pitch of a plate appearance carries the strikeout / walk
+    k_or_bb = np.full(n, "Undefined", dtype=object)
+    k_or_bb[np.isin(call, ["StrikeSwinging", "StrikeCalled"]) & (r.random(n) < 0.22)] = "Strikeout"
+    k_or_bb[(call == "BallCalled") & (r.random(n) < 0.10)] = "Walk"
+
+    tagged_type = pitch_type.copy()
+    tagged_type[r.random(n) < 0.02] = "Undefined"
+
+    return pd.DataFrame({
+        "Date": dates.strftime("%Y-%m-%d"),
+        "GameID": game_ids,
+        "Batter": [f"Hitter{i:03d}, Test" for i in batter_ids],
+        "Pitcher": [f"Arm{i:03d}, Test" for i in pitcher_ids],
+        "TaggedPitchType": tagged_type,
+        "AutoPitchType": pitch_type,
+        "PitchCall": call,
+        "RelSpeed": speed,
+        "SpinRate": spin,
+        "InducedVertBreak": ivb,
+        "Angle": angle,
+        "ExitSpeed": exit_speed,
+        "TaggedHitType": tagged_hit,
+        "PlayResult": play_result,
+        "KorBB": k_or_bb,
+        "PlateLocHeight": height,
+        "PlateLocSide": side,
+    })
+
+
+def synthetic_pitches(rows, seed=0, batters=30, pitchers=15):
+    """
+    Yield seeded TrackMan-style pitch rows in chunks of GENERATOR_CHUNK.
+
+    Covers every column the analysis reads, with per pitch type velocity, spin
+    and break, more swings at strikes, more whiffs on breaking balls, batted
+    ball results that depend on exit velocity and launch angle, and games/dates
+    in order.
+
+    Args:
+        rows (int): Total pitches.
+        seed (int): Same seed, same pitches.
+        batters (int): Distinct batters.
+        pitchers (int): Distinct pitchers.
+
+    Yields:
+        pd.DataFrame: Consecutive chunks in the master CSV layout.
+    """
+    for start in range(0, rows, GENERATOR_CHUNK):
+        yield _chunk(start, min(GENERATOR_CHUNK, rows - start), seed, batters, pitchers)
+
+
+def write_synthetic_csv(path, rows, seed=0, batters=30, pitchers=15):
+    """Write synthetic_pitches to a CSV one chunk at a time, so 10M rows never sit in memory."""
+    for i, chunk in enumerate(synthetic_pitches(rows, seed, batters, pitchers)):
+        chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+    return path
+
+
+def parse_size(text):
+    """"10k" -> 10000, "1m" -> 1000000, "2500" -> 2500."""
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+class StageTimer:
+    """Collects repeated timings of named stages."""
+    def __init__(self):
+        self.seconds = {}
+
+    def time(self, stage, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.seconds.setdefault(stage, []).append(time.perf_counter() - start)
+        return result
+
+    def summary(self):
+        return {stage: {"min": min(times), "median": statistics.median(times), "runs": len(times)}
+                for stage, times in self.seconds.items()}
+
+
+def _quiet(fn, *args, **kwargs):
+    # the pipeline prints progress for every batter, keep it out of the timings output
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+def bench_size(csv_path, repeat=3, figure_batters=3, work_dir=None):
+    """
+    Time every pipeline stage on one CSV.
+
+    Stages: csv_parse (CSV -> typed DataFrame), cache_build / cache_load (binary
+    cache), table_build (PitchTable), load_batters (every Batter),
+    load_batters_fine_grid (every Batter on FINE_GRID), filter_pitches (one Batter the way main() builds it), calculate_stats
+    (every batter), queries (BENCH_FILTERS for every batter, cold cache),
+    figure_build (strike zone figures, cold cache) and html_write (one figure,
+    full plotly.js embed).
+
+    Returns:
+        dict: Stage -> {"min", "median", "runs"} in seconds, plus counts.
+    """
+    import plotly.io as pio
+
+    timer = StageTimer()
+    work_dir = work_dir or tempfile.mkdtemp(prefix="bench_")
+    cache_dir = os.path.join(work_dir, "cache")
+    counts = {}
+    for _ in range(repeat):
+        timer.time("csv_parse", read_master_csv, csv_path)
+        _quiet(timer.time, "cache_build", build_cache, csv_path, cache_dir)
+        data = _quiet(timer.time, "cache_load", load_master_csv, csv_path, cache_dir=cache_dir)
+        table = timer.time("table_build", PitchTable, data)
+        batters = timer.time("load_batters", load_batters, table)
+        # includes binning the table onto the fine grid, which happens on first use
+        timer.time("load_batters_fine_grid", load_batters, table, grid=FINE_GRID)
+
+        name = next(iter(batters))
+        player = Batter(name, "general")
+        timer.time("filter_pitches", player.filter_pitches, data)
+
+        _quiet(timer.time, "calculate_stats", lambda: [b.calculate_stats() for b in batters.values()])
+
+        zone_cache.clear()
+        _quiet(timer.time, "queries", lambda: [filter_batter(b, *f) for b in batters.values() for f in BENCH_FILTERS])
+
+        zone_cache.clear()
+        sample = list(batters.values())[:figure_batters]
+        figures = _quiet(timer.time, "figure_build", lambda: [
+            create_strike_zone_plot_from_pitches(b, *BENCH_FILTERS[0], create_json=False, create_barchart=False,
+                                                 title="Benchmark", zone_stat_index=2, show_pitches=True)
+            for b in sample])
+
+        html_path = os.path.join(work_dir, "figure.html")
+        timer.time("html_write", pio.write_html, figures[0], html_path, auto_open=False)
+
+        counts = {"rows": len(table), "batters": len(batters), "queries": len(batters) * len(BENCH_FILTERS),
+                  "figures": len(figures), "html_bytes": os.path.getsize(html_path)}
+    return {"stages": timer.summary(), "counts": counts}
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmarks(sizes, seed=0, repeat=3, data_dir=".bench_data", figure_batters=3):
+    """
+    Generate (or reuse) a synthetic CSV for every size and benchmark it.
+
+    Returns:
+        dict: Machine-readable results, see README for the layout.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    results = {
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "seed": seed,
+        "repeat": repeat,
+        "sizes": [],
+    }
+    for rows in sizes:
+        csv_path = os.path.join(data_dir, f"synthetic_{rows}_seed{seed}.csv")
+        if not os.path.exists(csv_path):
+            print(f"Generating {rows} pitches -> {csv_path}")
+            write_synthetic_csv(csv_path, rows, seed)
+        print(f"Benchmarking {rows} pitches...")
+        with tempfile.TemporaryDirectory(prefix="bench_") as work_dir:
+            size_result = bench_size(csv_path, repeat, figure_batters, work_dir)
+        size_result["rows"] = rows
+        results["sizes"].append(size_result)
+        for stage, t in size_result["stages"].items():
+            print(f"  {stage:<22}{t['median']:10.4f}s")
+    return results
+
+
+def compare(old, new):
+    """Print median stage times of two result files side by side, with new/old ratios."""
+    old_sizes = {s["rows"]: s for s in old["sizes"]}
+    print(f"old {old.get('revision')}  new {new.get('revision')}")
+    for size in new["sizes"]:
+        before = old_sizes.get(size["rows"])
+        if before is None:
+            continue
+        print(f"{size['rows']} pitches")
+        for stage, t in size["stages"].items():
+            if stage in before["stages"]:
+                old_t = before["stages"][stage]["median"]
+                ratio = t["median"] / old_t if old_t else float("nan")
+                print(f"  {stage:<22}{old_t:10.4f}s {t['median']:10.4f}s  x{ratio:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on synthetic TrackMan data.")
+    parser.add_argument("--sizes", default="10k,100k,1m", help="comma separated pitch counts, e.g. 10k,100k,1m,10m")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per size, the median and min are kept")
+    parser.add_argument("--figure-batters", type=int, default=3, help="strike zone figures built per run")
+    parser.add_argument("--data-dir", default=".bench_data", help="generated CSVs are kept here and reused")
+    parser.add_argument("--output", default="bench_results.json", help="JSON results file")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    results = run_benchmarks([parse_size(s) for s in args.sizes.split(",")], args.seed, args.repeat,
+                             args.data_dir, args.figure_batters)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=4)
+    print("Saved", args.output)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+
+import instrument
+
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+# typed schema for the master CSV columns the analysis reads
+MASTER_SCHEMA = {
+    'Date': 'category',  # parsed into dates by PitchTable
+    'GameID': 'category',
+    'Batter': 'category',
+    'Pitcher': 'category',
+    'TaggedPitchType': 'category',
+    'AutoPitchType': 'category',
+    'PitchCall': 'category',
+    'RelSpeed': 'float64',
+    'SpinRate': 'float64',
+    'InducedVertBreak': 'float64',
+    'Angle': 'float64',
+    'ExitSpeed': 'float64',
+    'TaggedHitType': 'category',
+    'PlayResult': 'category',
+    'KorBB': 'category',
+    'PlateLocHeight': 'float64',
+    'PlateLocSide': 'float64',
+}
+
+CACHE_DIR = '.pitch_cache'
+
+
+def file_sha1(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def intern_text(value):
+    """The interned copy of a string, so equal names and call codes share one object; other values as they are."""
+    return sys.intern(value) if type(value) is str else value
+
+
+def intern_categories(column):
+    """A categorical column whose category strings are interned, see intern_text."""
+    categories = column.cat.categories
+    if categories.dtype != object:
+        return column
+    return column.cat.rename_categories([intern_text(c) for c in categories])
+
+
+class CategoryDictionary:
+    """
+    Append-only value <-> integer code table for one text column.
+
+    Every chunk (or file) encoded with the same dictionary gets the same code for
+    the same value, and a code never changes as new values turn up, so codes from
+    different chunks can be compared or used as array indexes directly. Values
+    are interned, see intern_text.
+    """
+    def __init__(self, values=()):
+        self.values = []  # code -> value
+        self.codes = {}  # value -> code
+        for value in values:
+            self.add(value)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, value):
+        return value in self.codes
+
+    def add(self, value):
+        """Code of a value, giving it the next free code the first time it is seen."""
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(intern_text(value))
+        return code
+
+    def encode(self, column):
+        """
+        Recode a text or categorical column onto this dictionary.
+
+        Returns:
+            pd.Series: Categorical whose categories are every value seen so far,
+            in code order, missing values stay missing.
+        """
+        if not isinstance(column.dtype, pd.CategoricalDtype):
+            column = column.astype('category')
+        # -1 (missing) indexes the trailing -1
+        mapping = np.array([self.add(v) for v in column.cat.categories] + [-1], dtype=np.int32)
+        codes = mapping[column.cat.codes.to_numpy()]
+        return pd.Series(pd.Categorical.from_codes(codes, self.values), index=column.index, name=column.name)
+
+
+def text_dictionaries(schema=MASTER_SCHEMA):
+    """A fresh CategoryDictionary for every text column of the schema."""
+    return {column: CategoryDictionary() for column, dtype in schema.items() if dtype == 'category'}
+
+
+def _schema_columns(path, schema):
+    header = pd.read_csv(path, nrows=0).columns
+    columns = [c for c in schema if c in header]
+    text = {c: 'category' for c in columns if schema[c] == 'category'}
+    return columns, text
+
+
+def _apply_schema(data, columns, schema):
+    data = data[columns]
+    for column in columns:
+        if schema[column] != 'category':
+            data[column] = pd.to_numeric(data[column], errors='coerce').astype(schema[column])
+    return data
+
+
+def read_master_csv(path, schema=MASTER_SCHEMA):
+    """
+    Parse the master CSV with the explicit schema instead of letting pandas guess.
+
+    Only the schema columns are read. Numeric columns that contain text such as
+    "Undefined" become NaN.
+    """
+    with instrument.span("read_csv"):
+        columns, text = _schema_columns(path, schema)
+        data = _apply_schema(pd.read_csv(path, usecols=columns, dtype=text), columns, schema)
+    instrument.count("csv_rows_parsed", len(data))
+    return data
+
+
+def iter_master_csv(path, chunksize=100_000, schema=MASTER_SCHEMA, dictionaries=None):
+    """
+    Parse the master CSV like read_master_csv, but in chunks of at most chunksize rows.
+
+    Only the schema columns are read, so memory depends on the chunk size and
+    not on the file size. Text columns are encoded onto shared dictionaries, so
+    a name or call code has the same category code in every chunk.
+
+    Args:
+        dictionaries (dict): Column -> CategoryDictionary to encode with, pass
+            the same ones to several files to share codes between them.
+            Defaults to fresh ones from text_dictionaries.
+
+    Yields:
+        pd.DataFrame: Consecutive rows of the file.
+    """
+    columns, text = _schema_columns(path, schema)
+    if dictionaries is None:
+        dictionaries = text_dictionaries(schema)
+    with pd.read_csv(path, usecols=columns, dtype=text, chunksize=chunksize) as reader:
+        for chunk in reader:
+            with instrument.span("read_csv"):
+                chunk = _apply_schema(chunk, columns, schema)
+                for column in text:
+                    if column in dictionaries:
+                        chunk[column] = dictionaries[column].encode(chunk[column])
+            instrument.count("csv_rows_parsed", len(chunk))
+            yield chunk
+
+
+def _cache_path(path, cache_dir):
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR)
+    return os.path.join(cache_dir, os.path.splitext(os.path.basename(path))[0])
+
+
+def _read_meta(folder):
+    try:
+        with open(os.path.join(folder, 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _is_fresh(path, folder, meta, schema):
+    if meta is None or meta.get('schema') != schema:
+        return False
+    stat = os.stat(path)
+    if meta['size'] == stat.st_size and meta['mtime_ns'] == stat.st_mtime_ns:
+        return True
+    # touched but not edited: keep the cache and remember the new mtime
+    if meta['size'] == stat.st_size and meta['sha1'] == file_sha1(path):
+        meta['mtime_ns'] = stat.st_mtime_ns
+        _write_meta(folder, meta)
+        return True
+    return False
+
+
+def _write_meta(folder, meta):
+    with open(os.path.join(folder, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=4)
+
+
+@instrument.timed("cache_build")
+def build_cache(path, cache_dir=None, schema=MASTER_SCHEMA, fmt='auto'):
+    """
+    Convert the master CSV into the binary cache.
+
+    Args:
+        path (str): Master CSV file.
+        cache_dir (str): Where caches live, defaults to .pitch_cache next to the CSV.
+        schema (dict): Column -> dtype.
+        fmt (str): "feather", "npy" or "auto" (feather when pyarrow is installed).
+
+    Returns:
+        str: Folder holding the cache.
+    """
+    if fmt == 'auto':
+        fmt = 'feather' if feather is not None else 'npy'
+    folder = _cache_path(path, cache_dir)
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder)
+
+    stat = os.stat(path)
+    data = read_master_csv(path, schema)
+    meta = {
+        'source': os.path.abspath(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha1': file_sha1(path),
+        'format': fmt,
+        'rows': len(data),
+        'columns': data.columns.tolist(),
+        'schema': schema,
+        'categories': {},
+    }
+    if fmt == 'feather':
+        # uncompressed so the file can be memory-mapped
+        feather.write_feather(data, os.path.join(folder, 'data.feather'), compression='uncompressed')
+    else:
+        for column in data.columns:
+            values = data[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                meta['categories'][column] = values.cat.categories.tolist()
+                np.save(os.path.join(folder, f'{column}.codes.npy'), values.cat.codes.to_numpy())
+            else:
+                np.save(os.path.join(folder, f'{column}.npy'), values.to_numpy())
+    # meta.json goes last, a cache without it is treated as missing
+    _write_meta(folder, meta)
+    return folder
+
+
+def _load_cache(folder, meta, columns):
+    if meta['format'] == 'feather':
+        table = feather.read_table(os.path.join(folder, 'data.feather'), columns=columns, memory_map=True)
+        return table.to_pandas()
+    data = {}
+    for column in columns:
+        if column in meta['categories']:
+            codes = np.load(os.path.join(folder, f'{column}.codes.npy'), mmap_mode='r')
+            data[column] = pd.Categorical.from_codes(codes, meta['categories'][column])
+        else:
+            data[column] = np.load(os.path.join(folder, f'{column}.npy'), mmap_mode='r')
+    return pd.DataFrame(data, copy=False)
+
+
+@instrument.timed("csv_load")
+def load_master_csv(path, columns=None, cache_dir=None, schema=MASTER_SCHEMA, fmt='auto'):
+    """
+    Load the master CSV through the binary cache.
+
+    The first call (or the first call after the CSV changes) parses the CSV and
+    writes the cache. Later calls memory-map only the requested columns.
+
+    Args:
+        path (str): Master CSV file.
+        columns (list): Columns to load, defaults to every schema column in the file.
+        cache_dir (str): Where caches live, defaults to .pitch_cache next to the CSV.
+        schema (dict): Column -> dtype.
+        fmt (str): "feather", "npy" or "auto".
+
+    Returns:
+        pd.DataFrame: The requested columns with the schema dtypes.
+    """
+    folder = _cache_path(path, cache_dir)
+    meta = _read_meta(folder)
+    if not _is_fresh(path, folder, meta, schema) or (meta['format'] == 'feather' and feather is None):
+        print("Building cache for", path)
+        build_cache(path, cache_dir, schema, fmt)
+        meta = _read_meta(folder)
+    columns = columns or meta['columns']
+    missing = [c for c in columns if c not in meta['columns']]
+    if missing:
+        raise KeyError(f"Columns not in {path}: {missing}")
+    return _load_cache(folder, meta, columns)
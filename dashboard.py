@@ -0,0 +1,461 @@
+import argparse
+import asyncio
+import json
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+import instrument
+from barchart import (DEFAULT_ZONE_GRID, PLOT_AREA, PitchTable, create_player_stats_bar_chart,
+                      create_strike_zone_plot_from_pitches, filter_batter, load_batters, parse_zone_grid,
+                      pitch_location_traces)
+from csv_cache import load_master_csv
+from result_cache import ResultCache
+
+# the server only ever listens here, it is meant for the laptop in the meeting room
+HOST = "127.0.0.1"
+
+# query parameter -> (type, default), the defaults are the ones of python barchart.py
+FILTER_PARAMS = {
+    'has_outcome': (bool, False),
+    'type_pitches': (str, "All"),
+    'velo_min': (float, 0.0),
+    'velo_max': (float, 200.0),
+    'spin_min': (float, 0.0),
+    'spin_max': (float, 4000.0),
+}
+PLOT_PARAMS = {
+    'zone_stat': (int, 2),
+    'hide_pitches': (bool, False),
+    'title': (str, ""),
+    'zone_grid': (str, "4x4"),
+    'shadow': (float, 0.0),
+    'grid_area': (str, "zone"),
+}
+# the zoomed in part of a strike zone plot, in feet, see pitches_json
+WINDOW_PARAMS = {
+    'x0': (float, PLOT_AREA[0]),
+    'x1': (float, PLOT_AREA[1]),
+    'y0': (float, PLOT_AREA[2]),
+    'y1': (float, PLOT_AREA[3]),
+}
+
+# biggest request head we read, anything longer is not a dashboard request
+MAX_REQUEST_HEAD = 16 * 1024
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class RequestError(Exception):
+    """A request the dashboard can't answer, sent back as a JSON error with this status."""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _to_bool(value):
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+def parse_params(query, spec):
+    """
+    Typed values for every parameter in spec, defaults for the missing ones.
+
+    Raises:
+        RequestError: A value doesn't parse.
+    """
+    params = {}
+    for name, (kind, default) in spec.items():
+        values = query.get(name)
+        if not values or values[-1] == "":
+            params[name] = default
+            continue
+        try:
+            params[name] = _to_bool(values[-1]) if kind is bool else kind(values[-1])
+        except ValueError:
+            raise RequestError(400, f"bad value for {name}: {values[-1]!r}")
+    return params
+
+
+class Dashboard:
+    """
+    Keeps the master CSV and every Batter in memory and answers figure requests.
+
+    Figures are built in a thread pool so a slow build never holds up other
+    requests, and the finished JSON is kept in a ResultCache keyed by the data
+    fingerprint plus every request parameter. Identical requests that arrive
+    while a figure is still being built wait for that build instead of
+    starting their own.
+    """
+    def __init__(self, csv_path, workers=4, cache_entries=512, cache_mb=256):
+        self.table = PitchTable(load_master_csv(csv_path))
+        self.batters = load_batters(self.table)
+        self.pitch_types = sorted(self.table.frame['pitch_type'].cat.categories)
+        self.fingerprint = self.table.fingerprint
+        self.cache = ResultCache(cache_entries, cache_mb * 2 ** 20)  # entries are JSON bytes, weighed exactly
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dashboard")
+        self._pending = {}  # cache key -> future of the build in progress
+        self._grids = {}  # zone grid parameters -> ZoneGrid, so repeat requests share one
+        self._plotlyjs = None
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _batter(self, query):
+        name = query.get('batter', [""])[-1]
+        if name not in self.batters:
+            raise RequestError(404, f"unknown batter: {name!r}")
+        return self.batters[name]
+
+    def _grid(self, plot):
+        key = (plot['zone_grid'], plot['shadow'], plot['grid_area'])
+        if key not in self._grids:
+            try:
+                self._grids[key] = parse_zone_grid(*key)
+            except ValueError:
+                raise RequestError(400, f"bad zone grid: {plot['zone_grid']!r}")
+        return self._grids[key]
+
+    async def _cached(self, key, build):
+        # JSON bytes from the cache, or from a build running in the thread pool
+        body = self.cache.get(key)
+        if body is not None:
+            instrument.count("dashboard_cache_hits")
+            return body
+        future = self._pending.get(key)
+        if future is None:
+            def run():
+                body = build()
+                self.cache.put(key, body)
+                return body
+            future = asyncio.get_running_loop().run_in_executor(self.executor, run)
+            self._pending[key] = future
+            future.add_done_callback(lambda _: self._pending.pop(key, None))
+        # shielded, so a client hanging up doesn't cancel a build others are waiting on
+        return await asyncio.shield(future)
+
+    async def batters_json(self, query):
+        return json.dumps({'batters': list(self.batters), 'pitch_types': self.pitch_types}).encode()
+
+    async def stats_json(self, query):
+        batter = self._batter(query)
+        filters = tuple(parse_params(query, FILTER_PARAMS).values())
+        grid = self._grid(parse_params(query, PLOT_PARAMS))
+        key = (self.fingerprint, 'stats', batter.name, grid.key) + filters
+        return await self._cached(key, lambda: _dumps(filter_batter(batter, *filters, grid=grid).get_stats()))
+
+    async def strikezone_json(self, query):
+        batter = self._batter(query)
+        filters = tuple(parse_params(query, FILTER_PARAMS).values())
+        plot = parse_params(query, PLOT_PARAMS)
+        grid = self._grid(plot)
+        title = plot['title'] or f"{batter.name} - {filters[1]} Pitches"
+        key = (self.fingerprint, 'strikezone', batter.name, grid.key, plot['zone_stat'], plot['hide_pitches'],
+               title) + filters
+
+        def build():
+            return _dumps(create_strike_zone_plot_from_pitches(
+                batter, *filters, create_json=False, create_barchart=False, title=title,
+                zone_stat_index=plot['zone_stat'], show_pitches=not plot['hide_pitches'], grid=grid))
+        return await self._cached(key, build)
+
+    async def pitches_json(self, query):
+        # the pitch traces for a zoomed in window of the strike zone plot: big
+        # plots are binned, zooming in brings back single pitches and their hover
+        batter = self._batter(query)
+        filters = tuple(parse_params(query, FILTER_PARAMS).values())
+        grid = self._grid(parse_params(query, PLOT_PARAMS))
+        window = parse_params(query, WINDOW_PARAMS)
+        area = (window['x0'], window['x1'], window['y0'], window['y1'])
+        if not (area[0] < area[1] and area[2] < area[3]):
+            raise RequestError(400, f"empty window: {area}")
+        key = (self.fingerprint, 'pitches', batter.name, grid.key, area) + filters
+
+        def build():
+            from pitch_query import batter_query
+            custom_batter = filter_batter(batter, *filters, grid=grid)
+            data = batter_query(batter).plot_frame(custom_batter.pitches.rows)
+            x, y = data['PlateLocSide'], data['PlateLocHeight']
+            data = data[(x >= area[0]) & (x <= area[1]) & (y >= area[2]) & (y <= area[3])].reset_index(drop=True)
+            data['Zone'] = grid.zone_numbers(data['PlateLocSide'], data['PlateLocHeight'])
+            data[['exit_Velocity', 'launch_angle']] = data[['exit_Velocity', 'launch_angle']].fillna(0.0)
+            return _dumps({'data': pitch_location_traces(data, True, grid, area)})
+        return await self._cached(key, build)
+
+    async def barchart_json(self, query):
+        batter = self._batter(query)
+        filters = tuple(parse_params(query, FILTER_PARAMS).values())
+        key = (self.fingerprint, 'barchart', batter.name) + filters
+
+        def build():
+            custom_batter = filter_batter(batter, *filters, grid=DEFAULT_ZONE_GRID)
+            return _dumps(create_player_stats_bar_chart(pd.DataFrame([custom_batter.get_stats()]), custom_batter.name))
+        return await self._cached(key, build)
+
+    async def plotly_js(self, query):
+        if self._plotlyjs is None:
+            from plotly.offline import get_plotlyjs
+            self._plotlyjs = get_plotlyjs().encode()
+        return self._plotlyjs
+
+    async def index(self, query):
+        return INDEX_HTML.encode()
+
+    ROUTES = {
+        '/': ('index', 'text/html; charset=utf-8'),
+        '/plotly.min.js': ('plotly_js', 'application/javascript'),
+        '/api/batters': ('batters_json', 'application/json'),
+        '/api/stats': ('stats_json', 'application/json'),
+        '/api/strikezone': ('strikezone_json', 'application/json'),
+        '/api/barchart': ('barchart_json', 'application/json'),
+        '/api/pitches': ('pitches_json', 'application/json'),
+    }
+
+    async def respond(self, method, target):
+        """
+        Answer one request.
+
+        Returns:
+            tuple: (status, content type, body bytes)
+        """
+        if method not in ("GET", "HEAD"):
+            raise RequestError(405, f"{method} not supported")
+        url = urlsplit(target)
+        route = self.ROUTES.get(url.path)
+        if route is None:
+            raise RequestError(404, f"no such page: {url.path}")
+        handler, content_type = route
+        with instrument.span("dashboard_request"):
+            body = await getattr(self, handler)(parse_qs(url.query))
+        return 200, content_type, body
+
+
+def _dumps(fig):
+    from plotly.utils import PlotlyJSONEncoder
+    # PlotlyJSONEncoder handles go objects and numpy values and writes NaN as null
+    return json.dumps(fig, cls=PlotlyJSONEncoder).encode()
+
+
+async def _read_request(reader):
+    # request line and headers, None once the client is done with the connection
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+    except asyncio.LimitOverrunError:
+        raise RequestError(400, "request head too large")
+    lines = head.decode('latin-1').split("\r\n")
+    parts = lines[0].split()
+    if len(parts) != 3:
+        raise RequestError(400, "malformed request line")
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        if name:
+            headers[name.strip().lower()] = value.strip()
+    return parts[0], parts[1], parts[2], headers
+
+
+def _write_response(writer, status, content_type, body, keep_alive, head_only=False):
+    header = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+              f"Content-Type: {content_type}\r\n"
+              f"Content-Length: {len(body)}\r\n"
+              f"Cache-Control: no-store\r\n"
+              f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(header.encode('latin-1'))
+    if not head_only:
+        writer.write(body)
+
+
+async def handle_connection(dashboard, reader, writer):
+    """Serve HTTP/1.1 requests on one connection until the client closes it."""
+    try:
+        while True:
+            try:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, target, version, headers = request
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == "HTTP/1.1"
+                status, content_type, body = await dashboard.respond(method, target)
+            except RequestError as e:
+                keep_alive = False
+                status, content_type, body = e.status, 'application/json', json.dumps({'error': str(e)}).encode()
+                method = "GET"
+            except Exception as e:
+                print("Error answering dashboard request:", str(e))
+                traceback.print_exc()
+                keep_alive = False
+                status, content_type, body = 500, 'application/json', json.dumps({'error': str(e)}).encode()
+                method = "GET"
+            _write_response(writer, status, content_type, body, keep_alive, head_only=method == "HEAD")
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(dashboard, port=8050):
+    server = await asyncio.start_server(lambda r, w: handle_connection(dashboard, r, w), HOST, port,
+                                        limit=MAX_REQUEST_HEAD)
+    print(f"Dashboard on http://{HOST}:{port}/ ({len(dashboard.batters)} batters), Ctrl+C to stop")
+    async with server:
+        await server.serve_forever()
+
+
+INDEX_HTML = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Hitter Dashboard</title>
+<script src="/plotly.min.js"></script>
+<style>
+body { font-family: sans-serif; margin: 8px; }
+form { display: flex; flex-wrap: wrap; gap: 8px; align-items: center; margin-bottom: 8px; }
+input[type=number] { width: 70px; }
+#figures { display: flex; flex-wrap: wrap; gap: 8px; }
+#error { color: #b00; }
+</style>
+</head>
+<body>
+<form id="filters">
+  <button type="button" id="prev">&larr;</button>
+  <select name="batter" id="batter"></select>
+  <button type="button" id="next">&rarr;</button>
+  <select name="type_pitches" id="type_pitches"><option>All</option></select>
+  Velo <input type="number" name="velo_min" value="0"> - <input type="number" name="velo_max" value="200">
+  Spin <input type="number" name="spin_min" value="0"> - <input type="number" name="spin_max" value="4000">
+  <select name="zone_stat">
+    <option value="0">AVG</option><option value="1">SLG</option>
+    <option value="2" selected>Exit Velo</option><option value="3">Whiff Rate</option>
+  </select>
+  <label><input type="checkbox" name="has_outcome"> Outcomes only</label>
+  <label><input type="checkbox" name="hide_pitches"> Hide pitches</label>
+  <span id="error"></span>
+</form>
+<div id="figures"><div id="strikezone"></div><div id="barchart"></div></div>
+<script>
+(function () {
+    var form = document.getElementById('filters');
+    var batter = document.getElementById('batter');
+    var error = document.getElementById('error');
+    var latest = 0;
+    var zoomRequest = 0;
+    var served = null;  // the strike zone figure as the server sent it
+
+    function params() {
+        var query = new URLSearchParams();
+        Array.prototype.forEach.call(form.elements, function (el) {
+            if (!el.name) return;
+            query.set(el.name, el.type === 'checkbox' ? (el.checked ? '1' : '0') : el.value);
+        });
+        return query.toString();
+    }
+    function fetchJSON(url) {
+        return fetch(url).then(function (r) {
+            return r.json().then(function (body) {
+                if (!r.ok) throw new Error(body.error || r.statusText);
+                return body;
+            });
+        });
+    }
+    function draw() {
+        // only the newest request gets drawn, so quick flipping never shows a stale hitter
+        var request = ++latest;
+        var query = params();
+        error.textContent = '';
+        Promise.all([fetchJSON('/api/strikezone?' + query), fetchJSON('/api/barchart?' + query)])
+            .then(function (figs) {
+                if (request !== latest) return;
+                served = JSON.parse(JSON.stringify(figs[0]));  // plotly keeps and changes the traces it is given
+                Plotly.react('strikezone', figs[0].data, figs[0].layout).then(watchZoom);
+                Plotly.react('barchart', figs[1].data, figs[1].layout);
+            })
+            .catch(function (e) { if (request === latest) error.textContent = e.message; });
+    }
+    function isPitches(trace) { return trace.name === 'Pitches' || trace.name === 'Pitch Sample'; }
+    function showPitches(traces) {
+        // swap the pitch traces, keeping the zoom and whether pitches are hidden
+        var plot = document.getElementById('strikezone');
+        var shown = plot.data.filter(isPitches)[0];
+        traces.forEach(function (t) { if (t.name === 'Pitches' && shown) t.visible = shown.visible; });
+        Plotly.react(plot, plot.data.filter(function (t) { return !isPitches(t); }).concat(traces), plot.layout);
+    }
+    function zoomed() {
+        // binned plots ask for the pitches of the zoomed window, one marker each once there are few enough
+        var plot = document.getElementById('strikezone');
+        if (!served || !served.data.some(function (t) { return t.name === 'Pitch Sample'; })) return;
+        var request = latest;
+        var x = plot.layout.xaxis.range, y = plot.layout.yaxis.range;
+        var full = served.layout.xaxis.range, fullY = served.layout.yaxis.range;
+        if (x[0] <= full[0] && x[1] >= full[1] && y[0] <= fullY[0] && y[1] >= fullY[1]) {
+            showPitches(JSON.parse(JSON.stringify(served.data.filter(isPitches))));
+            return;
+        }
+        var window = '&x0=' + x[0].toFixed(2) + '&x1=' + x[1].toFixed(2) +
+                     '&y0=' + y[0].toFixed(2) + '&y1=' + y[1].toFixed(2);
+        var asked = ++zoomRequest;
+        fetchJSON('/api/pitches?' + params() + window)
+            .then(function (fig) {
+                if (request === latest && asked === zoomRequest) showPitches(fig.data);
+            })
+            .catch(function (e) { if (request === latest) error.textContent = e.message; });
+    }
+    function watchZoom(plot) {
+        if (plot.zoomWatched) return;
+        plot.zoomWatched = true;
+        plot.on('plotly_relayout', function (e) {
+            if (Object.keys(e).some(function (k) { return /^[xy]axis[.](range|autorange)/.test(k); })) zoomed();
+        });
+    }
+    function step(by) {
+        var n = batter.options.length;
+        batter.selectedIndex = (batter.selectedIndex + by + n) % n;
+        draw();
+    }
+    fetchJSON('/api/batters').then(function (info) {
+        info.batters.forEach(function (name) { batter.add(new Option(name, name)); });
+        var types = document.getElementById('type_pitches');
+        info.pitch_types.forEach(function (name) { types.add(new Option(name, name)); });
+        draw();
+    });
+    form.addEventListener('change', draw);
+    document.getElementById('prev').onclick = function () { step(-1); };
+    document.getElementById('next').onclick = function () { step(1); };
+    document.addEventListener('keydown', function (e) {
+        if (e.target.tagName === 'INPUT') return;
+        if (e.key === 'ArrowLeft') step(-1);
+        if (e.key === 'ArrowRight') step(1);
+    });
+})();
+</script>
+</body>
+</html>
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local dashboard for flipping between hitters and filters.")
+    parser.add_argument("--csv", default="Regular Season Master CSV.csv", help="master CSV file")
+    parser.add_argument("--port", type=int, default=8050, help=f"port on {HOST}")
+    parser.add_argument("--workers", type=int, default=4, help="threads building figures")
+    parser.add_argument("--cache-entries", type=int, default=512, help="figures kept in memory")
+    parser.add_argument("--cache-mb", type=int, default=256, help="memory the kept figures may use, in MB")
+    args = parser.parse_args()
+
+    dashboard = Dashboard(args.csv, args.workers, args.cache_entries, args.cache_mb)
+    try:
+        asyncio.run(serve(dashboard, args.port))
+    except KeyboardInterrupt:
+        print("Dashboard stopped")
+    finally:
+        dashboard.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from barchart import (BATTER_TOTALS, DEFAULT_ZONE_GRID, PitchTable, batter_from_totals, batter_increments,
+                      batting_stats_frame, zone_increments)
+from csv_cache import load_master_csv
+
+
+class GameWindows:
+    """
+    Batter stats over any stretch of the season: a date range or the last N games.
+
+    Built in one grouped pass over the pitches. Every (batter, game) pair gets
+    one row of summed counters, pairs are kept sorted by batter and then by game
+    (date, then file order), and the counters are stored as running totals
+    (prefix sums). A window is then just two positions per batter: its stats
+    are the difference of two running totals, so any window costs O(zones) no
+    matter how many pitches it covers, and nothing is rescanned. Max exit
+    velocity can't be subtracted, it comes from a sparse table of per-game maxima
+    (also O(1) per window).
+
+    Sums over a window can differ from summing its pitches directly by floating
+    point rounding in the last digits (exit velocity and launch angle sums).
+    Pitches without a Date are left out.
+    """
+    def __init__(self, data, grid=None):
+        table = data if isinstance(data, PitchTable) else PitchTable(data)
+        if 'date' not in table.frame.columns:
+            raise KeyError("time windows need the Date column of the master CSV")
+        self.grid = grid if grid is not None else DEFAULT_ZONE_GRID
+        self.batter_names = table.frame['batter_name'].cat.categories
+        self._batter_index = {name: i for i, name in enumerate(self.batter_names)}
+        batter_codes = table.codes('batter_name')
+        dates = table.frame['date'].to_numpy()
+        rows = np.flatnonzero((batter_codes >= 0) & ~np.isnat(dates))
+
+        # games in season order: by date, then in file order for several games a day (GameID),
+        # one game per date in files without GameIDs
+        game_codes = table.codes('game_id', rows) if 'game_id' in table.frame.columns else np.full(len(rows), -1)
+        game_dates, day = np.unique(dates[rows], return_inverse=True)
+        games, first, game = np.unique(day.astype(np.int64) * (game_codes.max(initial=-1) + 2) + game_codes + 1,
+                                       return_index=True, return_inverse=True)
+        order = np.lexsort((first, day[first]))
+        rank = np.empty(len(games), dtype=np.intp)
+        rank[order] = np.arange(len(games))
+        game, first = rank[game], first[order]
+        self.game_dates = game_dates[day[first]]
+        self.game_ids = (table.frame['game_id'].to_numpy(dtype=object)[rows[first]] if 'game_id' in table.frame.columns
+                         else np.full(len(games), None, dtype=object))
+
+        # one row per (batter, game), sorted by batter then game
+        keys = batter_codes[rows].astype(np.int64) * len(games) + game
+        pairs, pair = np.unique(keys, return_inverse=True)
+        self._pairs = pairs
+        self.pair_batter, self.pair_game = np.divmod(pairs, len(games))
+        self.pair_pitches = np.bincount(pair, minlength=len(pairs))
+
+        increments, contact_exit_velocity = batter_increments(table, rows)
+        totals = np.zeros((len(pairs), len(BATTER_TOTALS)))
+        np.add.at(totals, pair, increments)
+        zones, zone_counts = zone_increments(table, rows, self.grid)
+        counts = np.zeros((len(pairs), self.grid.zone_count, 10))
+        np.add.at(counts, (pair, zones), zone_counts)
+        max_exit_velocity = np.zeros(len(pairs))
+        np.fmax.at(max_exit_velocity, pair, contact_exit_velocity)
+
+        # running totals with a leading zero row, a window [p0, p1) sums to totals[p1] - totals[p0]
+        self._totals = np.concatenate([np.zeros((1, len(BATTER_TOTALS))), np.cumsum(totals, axis=0)])
+        self._zones = np.concatenate([np.zeros((1,) + counts.shape[1:]), np.cumsum(counts, axis=0)])
+        # level k holds the max over 2**k pairs starting at each position
+        self._max_levels = [max_exit_velocity]
+        while 2 ** len(self._max_levels) <= len(pairs):
+            previous, step = self._max_levels[-1], 2 ** (len(self._max_levels) - 1)
+            self._max_levels.append(np.maximum(previous[:-step], previous[step:]))
+        # every batter's pairs are pair positions [start, end)
+        self._starts = np.searchsorted(self.pair_batter, np.arange(len(self.batter_names)), side='left')
+        self._ends = np.searchsorted(self.pair_batter, np.arange(len(self.batter_names)), side='right')
+
+    def __len__(self):
+        return len(self.game_dates)
+
+    def _code(self, batter):
+        code = self._batter_index.get(batter)
+        if code is None or self._starts[code] == self._ends[code]:
+            return None
+        return code
+
+    def _bounds(self, codes, start=None, end=None, last=None):
+        # pair positions [p0, p1) of each batter's window
+        first_game = 0 if start is None else np.searchsorted(self.game_dates, np.datetime64(pd.Timestamp(start), 'ns'))
+        stop_game = (len(self) if end is None
+                     else np.searchsorted(self.game_dates, np.datetime64(pd.Timestamp(end), 'ns'), side='right'))
+        base = codes.astype(np.int64) * len(self)
+        p0 = np.searchsorted(self._pairs, base + first_game)
+        p1 = np.searchsorted(self._pairs, base + stop_game)
+        if last is not None:
+            p0 = np.maximum(p0, p1 - last)
+        return p0, p1
+
+    def _max_exit_velocity(self, p0, p1):
+        # sparse table lookup: max of two overlapping power-of-two spans, 0 for empty windows
+        lengths = p1 - p0
+        result = np.zeros(len(p0))
+        filled = lengths > 0
+        level = np.zeros(len(p0), dtype=np.intp)
+        level[filled] = np.floor(np.log2(lengths[filled])).astype(np.intp)
+        for k in np.unique(level[filled]):
+            at = filled & (level == k)
+            spans = self._max_levels[k]
+            result[at] = np.maximum(spans[p0[at]], spans[p1[at] - 2 ** k])
+        return result
+
+    def games(self, batter):
+        """
+        The games a batter played, in season order.
+
+        Returns:
+            pd.DataFrame: date, game_id and pitches seen, one row per game.
+        """
+        code = self._code(batter)
+        if code is None:
+            return pd.DataFrame({'date': [], 'game_id': [], 'pitches': []})
+        start, end = self._starts[code], self._ends[code]
+        game = self.pair_game[start:end]
+        return pd.DataFrame({'date': self.game_dates[game], 'game_id': self.game_ids[game],
+                             'pitches': self.pair_pitches[start:end]})
+
+    def window(self, batter, start=None, end=None, last=None, role="Custom"):
+        """
+        A batter's stats over a stretch of games.
+
+        Args:
+            batter (str): Batter name.
+            start (str or date): First day, e.g. "2024-05-01", defaults to the start of the season.
+            end (str or date): Last day (included), defaults to the end of the season.
+            last (int): Only the batter's last this many games up to end.
+            role (str): Role given to the Batter.
+
+        Returns:
+            Batter: With calculate_stats already run, None if the batter has no dated pitches.
+        """
+        code = self._code(batter)
+        if code is None:
+            return None
+        p0, p1 = self._bounds(np.array([code]), start, end, last)
+        p0, p1 = p0[0], p1[0]
+        custom_batter = batter_from_totals(batter, role, self.grid, self._totals[p1] - self._totals[p0],
+                                           self._max_exit_velocity(np.array([p0]), np.array([p1]))[0],
+                                           self._zones[p1] - self._zones[p0])
+        custom_batter.calculate_stats()
+        return custom_batter
+
+    def roster_window(self, start=None, end=None, last=None):
+        """
+        Every batter's line over the same window, like roster_stats for part of the season.
+
+        Args:
+            start, end, last: As in window; last is each batter's own last N games.
+
+        Returns:
+            pd.DataFrame: Indexed by 'name', roster_stats columns plus games,
+            swings, whiffs and whiff_rate. Batters with no games in the window are left out.
+        """
+        codes = np.arange(len(self.batter_names))
+        p0, p1 = self._bounds(codes, start, end, last)
+        keep = p1 > p0
+        codes, p0, p1 = codes[keep], p0[keep], p1[keep]
+        stats = batting_stats_frame(self._totals[p1] - self._totals[p0], self._max_exit_velocity(p0, p1),
+                                    self.batter_names[codes])
+        stats.insert(0, 'games', p1 - p0)
+        return self._add_whiffs(stats, p0, p1)
+
+    def rolling(self, batter, games=10):
+        """
+        Trend of a batter's AVG, exit velocity and whiff rate over their last `games` games, after every game.
+
+        Returns:
+            pd.DataFrame: One row per game the batter played: date, game_id,
+            games (in the window, fewer at the start of the season) and the
+            roster_stats columns plus swings, whiffs and whiff_rate over the window.
+        """
+        code = self._code(batter)
+        if code is None:
+            return pd.DataFrame(columns=['date', 'game_id', 'games', 'avg', 'avg_exit_velocity', 'whiff_rate'])
+        start, end = self._starts[code], self._ends[code]
+        p1 = np.arange(start + 1, end + 1)
+        p0 = np.maximum(start, p1 - games)
+        game = self.pair_game[start:end]
+        stats = batting_stats_frame(self._totals[p1] - self._totals[p0], self._max_exit_velocity(p0, p1),
+                                    np.arange(len(p1)))
+        stats = self._add_whiffs(stats, p0, p1).reset_index(drop=True)
+        stats.insert(0, 'date', self.game_dates[game])
+        stats.insert(1, 'game_id', self.game_ids[game])
+        stats.insert(2, 'games', p1 - p0)
+        return stats
+
+    def _add_whiffs(self, stats, p0, p1):
+        counts = self._zones[p1] - self._zones[p0]
+        whiffs = counts[:, :, 3].sum(axis=1)
+        swings = whiffs + counts[:, :, 2].sum(axis=1)
+        stats['swings'] = swings
+        stats['whiffs'] = whiffs
+        stats['whiff_rate'] = np.divide(whiffs, swings, out=np.zeros(len(stats)), where=swings > 0)
+        return stats
+
+    def trend_chart(self, batter, games=10):
+        """
+        Rolling AVG and whiff rate lines, with exit velocity on a second axis, from rolling().
+        """
+        import plotly.graph_objects as go
+
+        trend = self.rolling(batter, games)
+        title = f"{batter} - Rolling {games} Games"
+        if trend.empty:
+            return {
+                'data': [],
+                'layout': {
+                    'title': f"No games found for {batter}",
+                    'annotations': [{
+                        'text': "No data for this batter.",
+                        'xref': "paper",
+                        'yref': "paper",
+                        'x': 0.5,
+                        'y': 0.5,
+                        'showarrow': False
+                    }]
+                }
+            }
+        hover = "Game %{customdata[0]} (%{customdata[1]} in window)<br>%{y:.3f}<extra></extra>"
+        customdata = trend[['game_id', 'games']].values
+        fig_data = [
+            go.Scatter(x=trend['date'], y=trend['avg'], mode='lines+markers', name='AVG',
+                       line=dict(color='green'), customdata=customdata, hovertemplate=hover),
+            go.Scatter(x=trend['date'], y=trend['whiff_rate'], mode='lines+markers', name='Whiff Rate',
+                       line=dict(color='blue'), customdata=customdata, hovertemplate=hover),
+            go.Scatter(x=trend['date'], y=trend['avg_exit_velocity'], mode='lines+markers', name='Avg Exit Velo',
+                       line=dict(color='red', dash='dash'), yaxis='y2', customdata=customdata,
+                       hovertemplate="Game %{customdata[0]} (%{customdata[1]} in window)<br>%{y:.1f} mph<extra></extra>"),
+        ]
+        layout = dict(
+            title=title,
+            xaxis=dict(title='Date'),
+            yaxis=dict(title='Rate', range=[0, max(1.0, float(trend[['avg', 'whiff_rate']].max().max()) * 1.1)]),
+            yaxis2=dict(title='Exit Velocity (mph)', overlaying='y', side='right', showgrid=False),
+            showlegend=True,
+            width=800,
+            height=450,
+            plot_bgcolor='white',
+            paper_bgcolor='white'
+        )
+        return {'data': fig_data, 'layout': layout}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batter stats over a date range or the last N games.")
+    parser.add_argument("--csv", default="Regular Season Master CSV.csv", help="master CSV file")
+    parser.add_argument("--batter", help="one batter, otherwise the whole roster")
+    parser.add_argument("--start", help="first day, e.g. 2024-05-01")
+    parser.add_argument("--end", help="last day (included)")
+    parser.add_argument("--last", type=int, help="only each batter's last N games")
+    parser.add_argument("--rolling", type=int, metavar="GAMES", help="with --batter, the rolling trend over GAMES games")
+    parser.add_argument("--html", help="with --batter and --rolling, write the trend chart here")
+    args = parser.parse_args()
+
+    windows = GameWindows(load_master_csv(args.csv))
+    columns = ['games', 'plate appearences', 'at_bats', 'hits', 'avg', 'obp', 'slg', 'k_rate', 'bb_rate',
+               'whiff_rate', 'avg_exit_velocity']
+    with pd.option_context('display.width', 200, 'display.max_rows', None, 'display.max_columns', None):
+        if args.batter and args.rolling:
+            trend = windows.rolling(args.batter, args.rolling)
+            print(trend[['date', 'game_id', 'games', 'avg', 'avg_exit_velocity', 'whiff_rate']]
+                  .round({'avg': 3, 'avg_exit_velocity': 1, 'whiff_rate': 3}))
+            if args.html:
+                import plotly.io as pio
+                pio.write_html(windows.trend_chart(args.batter, args.rolling), args.html, auto_open=False)
+                print("Saved", args.html)
+        else:
+            stats = windows.roster_window(args.start, args.end, args.last)
+            if args.batter:
+                stats = stats.loc[[args.batter]] if args.batter in stats.index else stats.iloc[:0]
+            print(stats[columns].round(3))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import contextlib
+import cProfile
+import functools
+import io
+import json
+import pstats
+import time
+import tracemalloc
+
+# the active recorder, None when instrumentation is off
+_recorder = None
+
+# handed out by span() when instrumentation is off, so an off span is one
+# global check and an empty with block
+_NO_SPAN = contextlib.nullcontext()
+
+
+class _Recorder:
+    def __init__(self, profile, memory):
+        self.started = time.perf_counter()
+        self.spans = {}
+        self.counters = {}
+        self.profiler = cProfile.Profile() if profile else None
+        self.memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.profiler is not None:
+            self.profiler.enable()
+
+    def add_span(self, name, seconds):
+        stats = self.spans.get(name)
+        if stats is None:
+            self.spans[name] = {"calls": 1, "total": seconds, "max": seconds}
+        else:
+            stats["calls"] += 1
+            stats["total"] += seconds
+            stats["max"] = max(stats["max"], seconds)
+
+    def stop(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+        summary = {
+            "wall": time.perf_counter() - self.started,
+            "spans": self.spans,
+            "counters": self.counters,
+        }
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            summary["memory"] = {"current_bytes": current, "peak_bytes": peak}
+        if self.profiler is not None:
+            summary["profile"] = _top_functions(self.profiler)
+        return summary
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if _recorder is not None:
+            _recorder.add_span(self.name, time.perf_counter() - self.start)
+
+
+def _top_functions(profiler, limit=25):
+    # the functions with the most cumulative time, as plain dicts for the JSON summary
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = []
+    for (filename, line, function), (_, calls, own, cumulative, _) in stats.stats.items():
+        rows.append({"function": f"{filename}:{line}({function})", "calls": calls,
+                     "own": own, "cumulative": cumulative})
+    rows.sort(key=lambda r: r["cumulative"], reverse=True)
+    return rows[:limit]
+
+
+def enable(profile=False, memory=False):
+    """
+    Start recording spans and counters.
+
+    Args:
+        profile (bool): Also run cProfile, the summary gets the top functions.
+        memory (bool): Also run tracemalloc, the summary gets current/peak bytes.
+    """
+    global _recorder
+    _recorder = _Recorder(profile, memory)
+
+
+def disable():
+    """
+    Stop recording.
+
+    Returns:
+        dict: Summary of the run, None if instrumentation wasn't on.
+    """
+    global _recorder
+    if _recorder is None:
+        return None
+    summary = _recorder.stop()
+    _recorder = None
+    return summary
+
+
+def enabled():
+    return _recorder is not None
+
+
+def span(name):
+    """
+    Time a pipeline stage, use as `with span("calculate_stats"):`.
+
+    Spans with the same name add up, the summary has calls, total and max seconds.
+    """
+    if _recorder is None:
+        return _NO_SPAN
+    return _Span(name)
+
+
+def timed(name):
+    """
+    Decorator version of span for whole functions.
+
+    Checks whether instrumentation is on at call time, so it can decorate
+    functions at import time. Keep it off hot per-pitch paths, an off call
+    still costs one extra function call.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return fn(*args, **kwargs)
+            with _Span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, n=1):
+    """Add n to a named counter (rows scanned, pitches matched, figures built, ...)."""
+    if _recorder is not None:
+        _recorder.counters[name] = _recorder.counters.get(name, 0) + n
+
+
+def write_summary(summary, path):
+    """Save a summary from disable() as JSON, "-" prints it instead."""
+    text = json.dumps(summary, indent=4)
+    if path == "-":
+        print(text)
+    else:
+        with open(path, "w") as f:
+            f.write(text)
@@ -0,0 +1,153 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from barchart import (BATTER_TOTALS, PitchTable, batter_increments, batting_stats_frame,
+                      create_player_stats_bar_chart, zone_increments)
+from csv_cache import load_master_csv
+
+
+class MatchupStore:
+    """
+    Head-to-head batting lines for every (batter, pitcher) pair in the master CSV.
+
+    Built in one grouped pass over the pitches. Only pairs that actually met are
+    stored (one row each in self.stats), and two dict-of-dict indexes map
+    batter -> pitcher -> row and pitcher -> batter -> row, so "this batter vs
+    this pitcher", "this batter vs every pitcher" and "this pitcher vs our
+    lineup" never rescan pitches.
+
+    self.stats has the roster_stats columns plus batter, pitcher, swings,
+    whiffs and whiff_rate.
+    """
+    def __init__(self, data):
+        table = data if isinstance(data, PitchTable) else PitchTable(data)
+        batter_names = table.frame['batter_name'].cat.categories
+        pitcher_names = table.frame['pitcher_name'].cat.categories
+        batter_codes = table.codes('batter_name')
+        pitcher_codes = table.codes('pitcher_name')
+        rows = np.flatnonzero((batter_codes >= 0) & (pitcher_codes >= 0))
+
+        # one integer key per pair that met, every counter below is grouped on it
+        keys = batter_codes[rows].astype(np.int64) * len(pitcher_names) + pitcher_codes[rows]
+        pairs, pair = np.unique(keys, return_inverse=True)
+
+        increments, contact_exit_velocity = batter_increments(table, rows)
+        totals = np.zeros((len(pairs), len(BATTER_TOTALS)))
+        np.add.at(totals, pair, increments)
+        max_exit_velocity = np.zeros(len(pairs))
+        np.fmax.at(max_exit_velocity, pair, contact_exit_velocity)
+        _, zone_counts = zone_increments(table, rows)
+        whiffs = np.bincount(pair, weights=zone_counts[:, 3], minlength=len(pairs))
+        swings = whiffs + np.bincount(pair, weights=zone_counts[:, 2], minlength=len(pairs))
+
+        batters = batter_names[pairs // len(pitcher_names)]
+        pitchers = pitcher_names[pairs % len(pitcher_names)]
+        stats = batting_stats_frame(totals, max_exit_velocity, np.arange(len(pairs)))
+        stats.insert(0, 'batter', batters)
+        stats.insert(1, 'pitcher', pitchers)
+        stats['swings'] = swings
+        stats['whiffs'] = whiffs
+        stats['whiff_rate'] = np.divide(whiffs, swings, out=np.zeros(len(pairs)), where=swings > 0)
+        stats.index.name = None
+        self.stats = stats
+
+        self._by_batter = {}
+        self._by_pitcher = {}
+        for i, (batter, pitcher) in enumerate(zip(batters, pitchers)):
+            self._by_batter.setdefault(batter, {})[pitcher] = i
+            self._by_pitcher.setdefault(pitcher, {})[batter] = i
+
+    def __len__(self):
+        return len(self.stats)
+
+    def get(self, batter, pitcher):
+        """
+        One batter's line against one pitcher.
+
+        Returns:
+            pd.Series: The matchup row, None if they never met.
+        """
+        i = self._by_batter.get(batter, {}).get(pitcher)
+        return None if i is None else self.stats.iloc[i]
+
+    def pitchers_faced(self, batter):
+        """Names of every pitcher the batter has faced."""
+        return list(self._by_batter.get(batter, {}))
+
+    def batters_faced(self, pitcher):
+        """Names of every batter the pitcher has faced."""
+        return list(self._by_pitcher.get(pitcher, {}))
+
+    def batter_vs(self, batter):
+        """
+        A batter's line against every pitcher faced.
+
+        Returns:
+            pd.DataFrame: Indexed by 'name' (pitcher), roster_stats columns.
+        """
+        return self._frame(self._by_batter.get(batter, {}))
+
+    def pitcher_vs(self, pitcher, lineup=None):
+        """
+        Every batter's line against a pitcher, e.g. our lineup against tonight's starter.
+
+        Args:
+            pitcher (str): Pitcher name.
+            lineup (list): Only these batters, in this order; the ones who never
+                faced him are left out.
+
+        Returns:
+            pd.DataFrame: Indexed by 'name' (batter), ready for create_player_stats_bar_chart.
+        """
+        faced = self._by_pitcher.get(pitcher, {})
+        if lineup is not None:
+            faced = {batter: faced[batter] for batter in lineup if batter in faced}
+        return self._frame(faced)
+
+    def _frame(self, positions):
+        frame = self.stats.iloc[list(positions.values())].drop(columns=['batter', 'pitcher'])
+        frame.index = pd.Index(list(positions), name='name')
+        return frame
+
+    def bar_chart(self, batter, pitcher):
+        """create_player_stats_bar_chart for one batter against one pitcher."""
+        label = f"{batter} vs {pitcher}"
+        row = self.get(batter, pitcher)
+        if row is None:
+            return create_player_stats_bar_chart(self.stats.iloc[:0].rename_axis('name'), label)
+        frame = row.drop(['batter', 'pitcher']).to_frame().T
+        frame.index = pd.Index([label], name='name')
+        return create_player_stats_bar_chart(frame, label)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Head-to-head batter vs pitcher lines.")
+    parser.add_argument("--csv", default="Regular Season Master CSV.csv", help="master CSV file")
+    parser.add_argument("--batter", help="batter name")
+    parser.add_argument("--pitcher", help="pitcher name")
+    parser.add_argument("--html", help="with --batter and --pitcher, write their bar chart here")
+    args = parser.parse_args()
+
+    store = MatchupStore(load_master_csv(args.csv))
+    columns = ['plate appearences', 'at_bats', 'hits', 'avg', 'obp', 'slg', 'k_rate', 'bb_rate', 'whiff_rate',
+               'avg_exit_velocity']
+    with pd.option_context('display.width', 200, 'display.max_rows', None, 'display.max_columns', None):
+        if args.batter and args.pitcher:
+            row = store.get(args.batter, args.pitcher)
+            print(row[columns] if row is not None else f"{args.batter} never faced {args.pitcher}")
+            if args.html:
+                import plotly.io as pio
+                pio.write_html(store.bar_chart(args.batter, args.pitcher), args.html, auto_open=False)
+                print("Saved", args.html)
+        elif args.batter:
+            print(store.batter_vs(args.batter)[columns].round(3))
+        elif args.pitcher:
+            print(store.pitcher_vs(args.pitcher)[columns].round(3))
+        else:
+            print(len(store), "matchups")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import hashlib
+import weakref
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from result_cache import zone_cache
+
+# pitch types that also count when the "Four-Seam" filter is picked
+FOUR_SEAM_GROUP = ("Cutter", "Sinker")
+
+
+class PitchQuery:
+    """
+    Precomputed indexes for answering strike zone filter queries over a set of pitches.
+
+    Holds a mask of pitches with an outcome, row positions for every pitch type
+    and velocity/spin values sorted once, so each (pitch type, velo range, spin
+    range, has_outcome) query is a few boolean operations and binary searches
+    instead of a Python loop over every pitch.
+    """
+    def __init__(self, table, rows=None):
+        self.table = table
+        self.rows = np.arange(len(table)) if rows is None else np.asarray(rows, dtype=np.intp)
+        frame = table.frame
+
+        self.action = frame['action'].to_numpy()[self.rows]
+        pitch_types = table.codes('pitch_type', self.rows)
+        self.type_categories = frame['pitch_type'].cat.categories
+        self.type_positions = pd.Series(np.arange(len(self.rows))).groupby(pitch_types).indices
+
+        # NaN sorts last, so it never falls inside a finite range
+        speed = frame['rel_speed'].to_numpy()[self.rows]
+        spin = frame['spin_rate'].to_numpy()[self.rows]
+        self.speed_order = np.argsort(speed, kind='stable')
+        self.speed_sorted = speed[self.speed_order]
+        self.spin_order = np.argsort(spin, kind='stable')
+        self.spin_sorted = spin[self.spin_order]
+
+    def __len__(self):
+        return len(self.rows)
+
+    @cached_property
+    def fingerprint(self):
+        """Identifies the exact pitches behind this query, used to key cached results."""
+        return hashlib.sha1(self.table.fingerprint.encode() + self.rows.tobytes()).hexdigest()
+
+    def _type_mask(self, type_pitches, exact_type=False):
+        mask = np.zeros(len(self.rows), dtype=bool)
+        names = [type_pitches] + (list(FOUR_SEAM_GROUP) if type_pitches == "Four-Seam" and not exact_type else [])
+        for name in names:
+            if name in self.type_categories:
+                mask[self.type_positions.get(self.type_categories.get_loc(name), [])] = True
+        return mask
+
+    def _range_mask(self, order, sorted_values, low, high):
+        mask = np.zeros(len(self.rows), dtype=bool)
+        start = np.searchsorted(sorted_values, low, side='left')
+        stop = np.searchsorted(sorted_values, high, side='right')
+        mask[order[start:stop]] = True
+        return mask
+
+    def mask(self, has_outcome, type_pitches, velo_min, velo_max, spin_min, spin_max, exact_type=False):
+        """
+        Boolean mask of the pitches matching a filter, with the same rules as
+        create_strike_zone_plot_from_pitches: a zero minimum with any maximum
+        keeps every speed (or spin), and "Four-Seam" also picks up cutters and
+        sinkers unless exact_type is set (the pitcher view, which splits by the
+        pitch type actually thrown).
+        """
+        mask = self.action.copy() if has_outcome else np.ones(len(self.rows), dtype=bool)
+        if type_pitches != "All":
+            mask &= self._type_mask(type_pitches, exact_type)
+        if not (velo_max and velo_min == 0):
+            mask &= self._range_mask(self.speed_order, self.speed_sorted, velo_min, velo_max)
+        if not (spin_max and spin_min == 0):
+            mask &= self._range_mask(self.spin_order, self.spin_sorted, spin_min, spin_max)
+        return mask
+
+    def select(self, has_outcome, type_pitches, velo_min, velo_max, spin_min, spin_max, exact_type=False):
+        """Table row positions of the matching pitches, in their original order."""
+        return self.rows[self.mask(has_outcome, type_pitches, velo_min, velo_max, spin_min, spin_max, exact_type)]
+
+    def plot_frame(self, rows):
+        """The per-pitch columns create_strike_zone_plot expects, for the given table rows."""
+        frame = self.table.frame.iloc[rows]
+        return pd.DataFrame({
+            "PlateLocSide": frame['plateLocSide'].to_numpy(),
+            "PlateLocHeight": frame['plateLocHeight'].to_numpy(),
+            "pitch_type": frame['pitch_type'].astype(object).to_numpy(),
+            "outcome": frame['outcome'].astype(object).to_numpy(),
+            "exit_Velocity": frame['exit_velocity'].to_numpy(),
+            "launch_angle": frame['launch_angle'].to_numpy(),
+            "rel_Speed": frame['rel_speed'].to_numpy(),
+            "spin_rate": frame['spin_rate'].to_numpy(),
+        })
+
+
+_queries = weakref.WeakKeyDictionary()
+
+
+def batter_query(batter):
+    """
+    The PitchQuery for a batter's pitches, built once and reused until the pitches change.
+
+    Batters loaded in bulk are queried straight from their PitchTable rows; batters
+    built with add_pitch get a small table made from their Pitch objects. When the
+    pitches change, cached results for the old ones are dropped from zone_cache.
+    """
+    pitches = batter.pitches
+    cached = _queries.get(batter)
+    if cached is not None and cached[0] is pitches and cached[1] == len(pitches):
+        return cached[2]
+    if cached is not None:
+        # the batter's pitches changed, results computed from the old ones are stale
+        zone_cache.invalidate(cached[2].fingerprint)
+    # the batter (or pitcher) hands over its table, so this module never imports
+    # barchart and running barchart.py as a script keeps one copy of its classes
+    query = PitchQuery(*batter.pitch_table())
+    _queries[batter] = (pitches, len(pitches), query)
+    return query
@@ -0,0 +1,162 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from barchart import (DEFAULT_ZONE_GRID, PitchTable, create_strike_zone_plot_from_pitches, load_pitchers,
+                      parse_zone_grid, zone_increments)
+from csv_cache import load_master_csv
+
+# measurement -> PitchTable column, each gets mean, percentiles and max per pitch type
+PITCH_MEASURES = {'velo': 'rel_speed', 'spin': 'spin_rate', 'ivb': 'IVB'}
+PERCENTILES = (10, 50, 90)
+
+
+def pitch_type_stats(data, grid=None):
+    """
+    Per pitcher and pitch type arsenal summary, in one grouped pass over the table.
+
+    Columns:
+        pitches, usage (share of the pitcher's pitches),
+        velo/spin/ivb _mean, _p10, _p50, _p90, _max (missing readings skipped),
+        swings, whiffs, whiff_rate (whiffs / swings, as in the zone whiff rate),
+        zone_rate (share thrown to the grid cells, the shadow ring left out),
+        zone_0 .. zone_16 on the default grid (share thrown to each zone, 0 is out of the zone).
+
+    Args:
+        data (pd.DataFrame or PitchTable): The master CSV.
+        grid (ZoneGrid): Plate zone layout, defaults to the 4x4 strike zone grid.
+
+    Returns:
+        pd.DataFrame: Indexed by (pitcher, pitch_type), pitchers in order of first appearance.
+    """
+    table = data if isinstance(data, PitchTable) else PitchTable(data)
+    grid = grid if grid is not None else DEFAULT_ZONE_GRID
+    frame = table.frame
+    pitcher_codes = table.codes('pitcher_name')
+    type_codes = table.codes('pitch_type')
+    rows = np.flatnonzero((pitcher_codes >= 0) & (type_codes >= 0))
+    pitcher_names = frame['pitcher_name'].cat.categories
+    type_names = frame['pitch_type'].cat.categories
+
+    # one integer key per (pitcher, pitch type), everything below groups on it
+    keys = pitcher_codes[rows].astype(np.int64) * len(type_names) + type_codes[rows]
+    groups, group = np.unique(keys, return_inverse=True)
+    n = len(groups)
+
+    pitches = np.bincount(group, minlength=n)
+    zones, increments = zone_increments(table, rows, grid)
+    contacts = np.bincount(group, weights=increments[:, 2], minlength=n)
+    whiffs = np.bincount(group, weights=increments[:, 3], minlength=n)
+    zone_counts = np.bincount(group * grid.zone_count + zones, minlength=n * grid.zone_count).reshape(n, grid.zone_count)
+
+    measures = pd.DataFrame({m: frame[c].to_numpy()[rows] for m, c in PITCH_MEASURES.items()})
+    grouped = measures.groupby(group, sort=True)
+    quantiles = grouped.quantile([p / 100 for p in PERCENTILES]).unstack()
+    means, maxes = grouped.mean(), grouped.max()
+
+    columns = {'pitches': pitches}
+    for m in PITCH_MEASURES:
+        columns[f'{m}_mean'] = means[m].to_numpy()
+        for p in PERCENTILES:
+            columns[f'{m}_p{p}'] = quantiles[(m, p / 100)].to_numpy()
+        columns[f'{m}_max'] = maxes[m].to_numpy()
+    swings = whiffs + contacts
+    columns['swings'] = swings
+    columns['whiffs'] = whiffs
+    columns['whiff_rate'] = np.divide(whiffs, swings, out=np.zeros(n), where=swings > 0)
+    shares = zone_counts / pitches[:, None]
+    columns['zone_rate'] = shares[:, 1:grid.grid_zones + 1].sum(axis=1)
+    for z in range(grid.zone_count):
+        columns[f'zone_{z}'] = shares[:, z]
+
+    index = pd.MultiIndex.from_arrays([pitcher_names[groups // len(type_names)], type_names[groups % len(type_names)]],
+                                      names=['pitcher', 'pitch_type'])
+    stats = pd.DataFrame(columns, index=index)
+    stats.insert(1, 'usage', stats['pitches'] / stats.groupby(level='pitcher')['pitches'].transform('sum'))
+
+    # pitchers in order of first appearance, each one's pitch types most used first
+    appearance = pd.unique(pitcher_codes[rows])
+    first_seen = np.zeros(len(pitcher_names), dtype=np.intp)
+    first_seen[appearance] = np.arange(len(appearance))
+    return stats.iloc[np.lexsort((-pitches, first_seen[groups // len(type_names)]))]
+
+
+def load_staff(data, names=None, grid=None):
+    """
+    Build every Pitcher (or just the named ones) with their pitch type breakdown.
+
+    Pitchers come from load_pitchers, so speed/spin summaries and pitch mix are
+    filled in one grouped pass, and pitch_type_stats is attached to each one.
+
+    Args:
+        data (pd.DataFrame or PitchTable): The master CSV.
+        names (list): Only these pitchers, defaults to everyone.
+        grid (ZoneGrid): Plate zone layout for the zone columns.
+
+    Returns:
+        dict: Pitcher objects keyed by name.
+    """
+    table = data if isinstance(data, PitchTable) else PitchTable(data)
+    pitchers = load_pitchers(table)
+    if names is not None:
+        pitchers = {name: pitchers[name] for name in names if name in pitchers}
+    stats = pitch_type_stats(table, grid)
+    for name, pitcher in pitchers.items():
+        pitcher.pitch_type_stats = stats.loc[name] if name in stats.index.get_level_values(0) else stats.iloc[:0]
+    return pitchers
+
+
+def create_pitcher_zone_plot(pitcher, type_pitches="All", title=None, zone_stat_index=3, show_pitches=True, grid=None):
+    """
+    Strike zone plot of a pitcher's pitches, built by create_strike_zone_plot_from_pitches.
+
+    The zone colors are what batters did against the pitcher in each zone (AVG,
+    SLG, exit velocity or whiff rate, same zone_stat_index as for batters).
+    Goes through the same query indexes and figure cache as the batter plots.
+    Pitches are picked by their exact type, so "Four-Seam" leaves out the
+    cutters and sinkers the batter filter groups with it and the plot shows the
+    same pitches as the pitch_type_stats row.
+    """
+    title = title or f"{pitcher.name} - {type_pitches} Pitches"
+    return create_strike_zone_plot_from_pitches(
+        pitcher, has_outcome=False, type_pitches=type_pitches, velo_min=0, velo_max=200, spin_min=0, spin_max=4000,
+        create_json=False, create_barchart=False, title=title, zone_stat_index=zone_stat_index,
+        show_pitches=show_pitches, grid=grid, exact_type=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per pitch type report for a pitching staff.")
+    parser.add_argument("--csv", default="Regular Season Master CSV.csv", help="master CSV file")
+    parser.add_argument("--pitcher", action="append", help="only this pitcher, can be repeated")
+    parser.add_argument("--out", help="save the per pitch type table as CSV")
+    parser.add_argument("--plots", metavar="DIR", help="write a strike zone plot per pitcher and pitch type here")
+    parser.add_argument("--zone-grid", default="4x4", metavar="ROWSxCOLS", help="plate zone grid, e.g. 3x3 or 12x12")
+    parser.add_argument("--shadow", type=float, default=0.0, metavar="FEET",
+                        help="add a shadow/chase ring this wide around the zone grid")
+    args = parser.parse_args()
+
+    grid = parse_zone_grid(args.zone_grid, args.shadow)
+    pitchers = load_staff(load_master_csv(args.csv), args.pitcher, grid)
+    stats = pd.concat({name: p.pitch_type_stats for name, p in pitchers.items()}, names=['pitcher'])
+    if args.out:
+        stats.to_csv(args.out)
+        print("Saved", args.out)
+    with pd.option_context('display.width', 200, 'display.max_rows', None, 'display.max_columns', None):
+        print(stats[['pitches', 'usage', 'velo_mean', 'velo_max', 'spin_mean', 'ivb_mean',
+                     'whiff_rate', 'zone_rate']].round(3))
+
+    if args.plots:
+        from report_writer import write_figure, write_plotly_js
+        from batch_reports import safe_name
+        plotlyjs_path = write_plotly_js(args.plots)
+        for name, pitcher in pitchers.items():
+            for pitch_type in ["All"] + list(pitcher.pitch_type_stats.index):
+                path = os.path.join(args.plots, f"{safe_name(name)}_{safe_name(pitch_type)}.html")
+                write_figure(create_pitcher_zone_plot(pitcher, pitch_type, grid=grid), path, plotlyjs_path)
+        print("Saved plots to", args.plots)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import html
+import json
+import os
+
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+from plotly.utils import PlotlyJSONEncoder
+
+import instrument
+
+# one copy of plotly.js shared by every report in a folder tree
+PLOTLY_JS = 'plotly.min.js'
+
+_PAGE_STYLE = """
+body { font-family: sans-serif; margin: 0; }
+nav { position: sticky; top: 0; background: #f4f4f4; padding: 6px; border-bottom: 1px solid #ccc; }
+nav button { margin: 2px; }
+nav button.current { font-weight: bold; }
+.page { padding: 8px; }
+.figure { width: 100%; height: 600px; }
+"""
+
+# figures are only drawn when their page is first shown, so big books open fast
+_PAGE_SCRIPT = """
+(function () {
+    var pages = document.querySelectorAll('section.page');
+    var nav = document.getElementById('pages');
+    function show(i) {
+        pages.forEach(function (page, j) {
+            page.hidden = i !== j;
+            nav.children[j].className = i === j ? 'current' : '';
+        });
+        pages[i].querySelectorAll('div.figure').forEach(function (div) {
+            if (div.dataset.drawn) return;
+            var fig = JSON.parse(document.getElementById(div.id + '-json').textContent);
+            Plotly.newPlot(div, fig.data || [], fig.layout || {}, {responsive: true});
+            div.dataset.drawn = '1';
+        });
+    }
+    pages.forEach(function (page, i) {
+        var button = document.createElement('button');
+        button.textContent = page.dataset.title;
+        button.onclick = function () { show(i); };
+        nav.appendChild(button);
+    });
+    if (pages.length) show(0);
+})();
+"""
+
+
+def write_plotly_js(out_dir):
+    """
+    Put the plotly.js bundle from the installed plotly package in out_dir, once.
+
+    Returns:
+        str: Path of the shared plotly.min.js.
+    """
+    path = os.path.join(out_dir, PLOTLY_JS)
+    source = get_plotlyjs()
+    # rewrite only when missing or left over from a different plotly version
+    if not os.path.exists(path) or os.path.getsize(path) != len(source.encode('utf-8')):
+        os.makedirs(out_dir, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(source)
+    return path
+
+
+def _script_src(plotlyjs_path, html_path):
+    # relative, so the report folder can be moved or zipped and still work offline
+    relative = os.path.relpath(plotlyjs_path, os.path.dirname(os.path.abspath(html_path)))
+    return relative.replace(os.sep, '/')
+
+
+def write_figure(fig, path, plotlyjs_path, auto_open=False):
+    """
+    Write a figure to an HTML file that loads the shared plotly.js instead of embedding it.
+
+    Args:
+        fig (go.Figure or dict): Figure to write.
+        path (str): Output HTML file.
+        plotlyjs_path (str): Shared plotly.min.js from write_plotly_js.
+        auto_open (bool): Open the file in a browser afterwards.
+    """
+    with instrument.span("write_html"):
+        pio.write_html(fig, path, include_plotlyjs=_script_src(os.path.abspath(plotlyjs_path), path),
+                       auto_open=auto_open)
+
+
+def _figure_dict(fig):
+    return fig.to_plotly_json() if hasattr(fig, 'to_plotly_json') else fig
+
+
+class ReportBook:
+    """
+    One HTML document holding many figures, split into pages with a button per page.
+
+    Each figure is streamed into the file as JSON as soon as it is added, so a
+    book with hundreds of figures never exists as one string in memory.
+    Use as a context manager:
+
+        with ReportBook("reports/Entrekin_Jake.html", plotlyjs_path) as book:
+            book.add_page("All", [zone_fig, bar_chart])
+    """
+    def __init__(self, path, plotlyjs_path, title="Reports"):
+        self.path = path
+        self.plotlyjs_path = plotlyjs_path
+        self.title = title
+        self.pages = 0
+        self.figures = 0
+        self._file = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def open(self):
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._file.write('<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n')
+        self._file.write(f'<title>{html.escape(self.title)}</title>\n')
+        self._file.write(f'<script src="{html.escape(_script_src(os.path.abspath(self.plotlyjs_path), self.path))}"></script>\n')
+        self._file.write(f'<style>{_PAGE_STYLE}</style>\n</head>\n<body>\n<nav id="pages"></nav>\n')
+
+    def add_page(self, title, figures):
+        """
+        Append a page with the given figures.
+
+        Args:
+            title (str): Label of the page button.
+            figures (list): go.Figure objects or figure dicts.
+        """
+        f = self._file
+        f.write(f'<section class="page" data-title="{html.escape(title)}" hidden>\n')
+        for fig in figures:
+            div_id = f'fig-{self.figures}'
+            f.write(f'<div class="figure" id="{div_id}"></div>\n')
+            f.write(f'<script type="application/json" id="{div_id}-json">')
+            self._write_figure_json(_figure_dict(fig))
+            f.write('</script>\n')
+            self.figures += 1
+        f.write('</section>\n')
+        self.pages += 1
+
+    def _write_json(self, value):
+        # PlotlyJSONEncoder turns NaN into null, "</" is escaped so it can't end the script tag
+        self._file.write(json.dumps(value, cls=PlotlyJSONEncoder).replace('</', '<\\/'))
+
+    def _write_figure_json(self, fig):
+        # one trace at a time, so only a single trace is ever held as a string
+        f = self._file
+        f.write('{"data": [')
+        for i, trace in enumerate(fig.get('data', [])):
+            if i:
+                f.write(', ')
+            self._write_json(trace)
+        f.write('], "layout": ')
+        self._write_json(fig.get('layout', {}))
+        f.write('}')
+
+    def close(self):
+        if self._file is None:
+            return
+        self._file.write(f'<script>{_PAGE_SCRIPT}</script>\n</body>\n</html>\n')
+        self._file.close()
+        self._file = None
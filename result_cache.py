@@ -0,0 +1,120 @@
+from collections import OrderedDict
+import threading
+
+import numpy as np
+
+# rough bytes per Python object in lists and object arrays (pointer plus a float or shared string)
+OBJECT_BYTES = 32
+
+
+def approximate_size(value, _seen=None):
+    """
+    Rough bytes a cached value holds: array buffers, JSON bytes and so on.
+
+    Goes through dicts, lists, Plotly figures and plain objects (like a custom
+    Batter). PitchTables (anything with a frame) are shared by every result built
+    from them, so they count as nothing; each object is counted once.
+    """
+    if value is None or isinstance(value, (bool, int, float, complex, np.generic)):
+        return 16
+    # id -> object, holding on to temporaries (to_plotly_json dicts) so their ids aren't reused
+    seen = {} if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen[id(value)] = value
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if isinstance(value, np.ndarray):
+        return value.size * OBJECT_BYTES if value.dtype == object else value.nbytes
+    if hasattr(value, 'memory_usage'):  # pandas Series / DataFrame
+        return int(np.sum(value.memory_usage(index=False, deep=False)))
+    if hasattr(value, 'frame'):
+        return 0
+    if hasattr(value, 'to_plotly_json'):
+        return approximate_size(value.to_plotly_json(), seen)
+    if isinstance(value, dict):
+        return sum(approximate_size(v, seen) for v in value.values())
+    if isinstance(value, (list, tuple, set)):
+        return len(value) * 8 + sum(approximate_size(v, seen) for v in value)
+    if hasattr(value, '__dict__'):
+        return sum(approximate_size(v, seen) for v in vars(value).values())
+    return OBJECT_BYTES
+
+
+class ResultCache:
+    """
+    Bounded least-recently-used cache for filtered zone stats and figures.
+
+    Keys are tuples whose first item is the fingerprint of the data they were
+    computed from (see PitchQuery.fingerprint), so results for changed data are
+    never returned and invalidate() can drop them all at once. Cached values are
+    shared between callers and should be treated as read-only.
+
+    Bounded both by entries and by bytes: every entry is weighed when it is put
+    (approximate_size, or the size passed in) and the least recently used ones
+    are dropped until the total fits max_bytes. A big figure with a customdata
+    row per pitch pushes out many small stats entries, and an entry bigger than
+    the whole budget is not kept at all.
+    """
+    def __init__(self, max_entries=256, max_bytes=128 * 2 ** 20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, key, value, size=None):
+        """
+        Cache a value.
+
+        Args:
+            key (tuple): Data fingerprint first.
+            value: The result.
+            size (int): Its size in bytes, defaults to approximate_size(value).
+        """
+        size = approximate_size(value) if size is None else size
+        with self._lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = value
+            self._sizes[key] = size
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        if key in self._entries:
+            del self._entries[key]
+            self.bytes -= self._sizes.pop(key)
+
+    def invalidate(self, fingerprint):
+        """Drop every entry computed from data with this fingerprint."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == fingerprint]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.bytes = 0
+
+
+# shared by create_strike_zone_plot_from_pitches
+zone_cache = ResultCache()
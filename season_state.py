@@ -0,0 +1,366 @@
+import argparse
+import json
+import os
+from collections import Counter
+
+import numpy as np
+
+from barchart import (Pitcher, PitchTable, RunningStat, ZoneGrid, BATTER_TOTALS, DEFAULT_ZONE_GRID,
+                      batter_from_totals, batter_increments, load_pitchers, report_unknown_outcomes,
+                      zone_increments)
+from csv_cache import CategoryDictionary, file_sha1, iter_master_csv, read_master_csv
+
+# per-pitcher speed and spin accumulators kept by SeasonState, the RunningStat fields
+PITCHER_STATS = RunningStat.__slots__
+
+
+class SeasonState:
+    """
+    Season-to-date accumulators that new games can be folded into.
+
+    Holds per-batter totals and plate zone counter matrices and per-pitcher
+    speed/spin RunningStat fields (count, exact sum and sum of squares, max)
+    and pitch type counts, so a new game only costs its own rows. Every batter
+    counter is added row by row in file order with np.add.at, so folding games
+    one at a time gives exactly the same numbers as folding the whole season
+    at once. Pitcher speed/spin sums are exact (see RunningStat), so folding
+    games one at a time or a file in chunks gives exactly what load_pitchers
+    gives on all of it too.
+
+    Batters, pitchers and pitch types are numbered by CategoryDictionary
+    codes, and a name's code is its row in the arrays. fold_csv reads chunks
+    encoded onto the same dictionaries (see iter_master_csv), so their
+    category codes are used as rows directly.
+
+    The zone matrices follow grid (the 4x4 strike zone grid by default), which
+    is saved with the state.
+    """
+    def __init__(self, grid=None):
+        self.grid = grid if grid is not None else DEFAULT_ZONE_GRID
+        # master CSV column -> CategoryDictionary, the code of a name is its row
+        self.dictionaries = {'Batter': CategoryDictionary(), 'Pitcher': CategoryDictionary()}
+        self.batter_totals = np.zeros((0, len(BATTER_TOTALS)))
+        self.batter_max_exit_velocity = np.zeros(0)
+        self.batter_zones = np.zeros((0, self.grid.zone_count, 10))
+
+        self.pitcher_speed = np.zeros((0, len(PITCHER_STATS)))
+        self.pitcher_spin = np.zeros((0, len(PITCHER_STATS)))
+        self._pitch_types = CategoryDictionary()  # None stands for a blank pitch type, Pitcher counts those as NaN
+        self.pitch_type_counts = np.zeros((0, 0), dtype=np.int64)
+
+        self.sources = []  # SHA-1 of every file folded in
+        # call combinations folded in as "Undefined", see report_unknown_outcomes; not saved
+        self.unknown_outcomes = Counter()
+
+    @property
+    def batter_names(self):
+        return self.dictionaries['Batter'].values
+
+    @property
+    def pitcher_names(self):
+        return self.dictionaries['Pitcher'].values
+
+    @property
+    def pitch_types(self):
+        return self._pitch_types.values
+
+    @staticmethod
+    def _positions(dictionary, table, column, rows, blanks=False):
+        # state position (dictionary code) of every row's category, adding names seen for the
+        # first time; blanks are -1, or the position of a None name when blanks is True
+        codes = table.codes(column, rows)
+        categories = table.frame[column].cat.categories
+        positions = np.full(len(categories) + 1, -1, dtype=np.intp)
+        for code in np.unique(codes if blanks else codes[codes >= 0]):
+            positions[code] = dictionary.add(categories[code] if code >= 0 else None)
+        return positions[codes]
+
+    def _grow(self):
+        batters = len(self.batter_names) - len(self.batter_totals)
+        if batters:
+            self.batter_totals = np.vstack([self.batter_totals, np.zeros((batters, len(BATTER_TOTALS)))])
+            self.batter_max_exit_velocity = np.concatenate([self.batter_max_exit_velocity, np.zeros(batters)])
+            self.batter_zones = np.concatenate([self.batter_zones, np.zeros((batters, self.grid.zone_count, 10))])
+        pitchers = len(self.pitcher_names) - len(self.pitcher_speed)
+        if pitchers:
+            self.pitcher_speed = np.vstack([self.pitcher_speed, np.zeros((pitchers, len(PITCHER_STATS)))])
+            self.pitcher_spin = np.vstack([self.pitcher_spin, np.zeros((pitchers, len(PITCHER_STATS)))])
+        rows, cols = len(self.pitcher_names), len(self.pitch_types)
+        if self.pitch_type_counts.shape != (rows, cols):
+            counts = np.zeros((rows, cols), dtype=np.int64)
+            counts[:self.pitch_type_counts.shape[0], :self.pitch_type_counts.shape[1]] = self.pitch_type_counts
+            self.pitch_type_counts = counts
+
+    def fold(self, data, rows=None, encoded=False):
+        """
+        Add the pitches of a DataFrame (for example last night's game) to the season.
+
+        Unknown call combinations of a DataFrame are added to unknown_outcomes
+        instead of printed; fold_csv prints them once per file. A PitchTable
+        reported its own when it was built.
+
+        Args:
+            data (pd.DataFrame or PitchTable): Rows in the master CSV layout.
+            rows (array-like): Only fold these row positions, defaults to every row.
+            encoded (bool): data was read with iter_master_csv(..., dictionaries=self.dictionaries)
+                and every Batter/Pitcher value in it is on a folded row, so its codes
+                already are state positions.
+        """
+        if isinstance(data, PitchTable):
+            table = data
+        else:
+            table = PitchTable(data, report=False)
+            self.unknown_outcomes.update(table.unknown_outcomes)
+        frame = table.frame
+        rows = np.arange(len(table)) if rows is None else np.asarray(rows, dtype=np.intp)
+        if encoded:
+            batters = table.codes('batter_name', rows).astype(np.intp)
+            pitchers = table.codes('pitcher_name', rows).astype(np.intp)
+        else:
+            batters = self._positions(self.dictionaries['Batter'], table, 'batter_name', rows)
+            pitchers = self._positions(self.dictionaries['Pitcher'], table, 'pitcher_name', rows)
+        pitch_types = self._positions(self._pitch_types, table, 'pitch_type', rows, blanks=True)
+        self._grow()
+
+        keep = batters >= 0
+        increments, contact_exit_velocity = batter_increments(table, rows[keep])
+        np.add.at(self.batter_totals, batters[keep], increments)
+        np.fmax.at(self.batter_max_exit_velocity, batters[keep], contact_exit_velocity)
+        zones, increments = zone_increments(table, rows[keep], self.grid)
+        np.add.at(self.batter_zones, (batters[keep], zones), increments)
+
+        keep = np.flatnonzero(pitchers >= 0)
+        # each pitcher's rows in file order, merged in one add_array like Pitcher.add_rows
+        keep = keep[np.argsort(pitchers[keep], kind='stable')]
+        speed = frame['rel_speed'].to_numpy()[rows[keep]]
+        spin = frame['spin_rate'].to_numpy()[rows[keep]]
+        positions, starts = np.unique(pitchers[keep], return_index=True)
+        for position, start, stop in zip(positions, starts, np.append(starts[1:], len(keep))):
+            for stats, values in ((self.pitcher_speed, speed), (self.pitcher_spin, spin)):
+                stat = _running_stat(stats[position])
+                stat.add_array(values[start:stop])
+                stats[position] = [getattr(stat, field) for field in PITCHER_STATS]
+        np.add.at(self.pitch_type_counts, (pitchers[keep], pitch_types[keep]), 1)
+
+    def fold_csv(self, path, chunksize=None):
+        """
+        Fold a game CSV into the season unless it was already added.
+
+        Args:
+            path (str): CSV in the master CSV layout.
+            chunksize (int): Read and fold the file this many rows at a time, so
+                files bigger than memory work. Gives the same numbers as
+                folding the whole file at once.
+
+        Returns:
+            bool: True if the file was new.
+        """
+        sha1 = file_sha1(path)
+        if sha1 in self.sources:
+            print(path, "is already in the season state")
+            return False
+        before = self.unknown_outcomes.copy()
+        if chunksize:
+            # chunks come encoded onto the state's dictionaries, their codes are the state rows
+            for chunk in iter_master_csv(path, chunksize, dictionaries=self.dictionaries):
+                self.fold(chunk, encoded=True)
+        else:
+            self.fold(read_master_csv(path))
+        # once for the whole file, however many chunks it took
+        report_unknown_outcomes(self.unknown_outcomes - before)
+        self.sources.append(sha1)
+        return True
+
+    def batter(self, name, role="general"):
+        """Build a Batter with the season totals, ready for calculate_stats."""
+        i = self.dictionaries['Batter'].codes[name]
+        return batter_from_totals(name, role, self.grid, self.batter_totals[i], self.batter_max_exit_velocity[i],
+                                  self.batter_zones[i])
+
+    def batters(self, role="general"):
+        return {name: self.batter(name, role) for name in self.batter_names}
+
+    def pitcher(self, name):
+        """Build a Pitcher with the season speed/spin summary and pitch mix."""
+        i = self.dictionaries['Pitcher'].codes[name]
+        pitcher = Pitcher(name, [])
+        pitcher.speed = _running_stat(self.pitcher_speed[i])
+        pitcher.spin = _running_stat(self.pitcher_spin[i])
+        pitcher.pitch_type_counts = Counter({np.nan if t is None else t: int(n)
+                                             for t, n in zip(self.pitch_types, self.pitch_type_counts[i]) if n})
+        pitcher._update_fields()
+        return pitcher
+
+    def pitchers(self):
+        return {name: self.pitcher(name) for name in self.pitcher_names}
+
+    def save(self, path):
+        names = {
+            'batter_names': self.batter_names,
+            'pitcher_names': self.pitcher_names,
+            'pitch_types': self.pitch_types,
+            'sources': self.sources,
+            'grid': [self.grid.rows, self.grid.cols, self.grid.shadow, list(self.grid.bounds)],
+        }
+        with open(path, 'wb') as f:
+            np.savez(f, names=np.array(json.dumps(names)),
+                     batter_totals=self.batter_totals,
+                     batter_max_exit_velocity=self.batter_max_exit_velocity,
+                     batter_zones=self.batter_zones,
+                     pitcher_speed=self.pitcher_speed,
+                     pitcher_spin=self.pitcher_spin,
+                     pitch_type_counts=self.pitch_type_counts)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as saved:
+            names = json.loads(str(saved['names']))
+            # states saved before grids were configurable are on the default grid
+            rows, cols, shadow, bounds = names.get('grid', (4, 4, 0.0, None))
+            grid = ZoneGrid(rows, cols, shadow, tuple(bounds) if bounds else None)
+            state = cls(DEFAULT_ZONE_GRID if grid == DEFAULT_ZONE_GRID else grid)
+            state.dictionaries = {'Batter': CategoryDictionary(names['batter_names']),
+                                  'Pitcher': CategoryDictionary(names['pitcher_names'])}
+            state._pitch_types = CategoryDictionary(names['pitch_types'])
+            state.sources = names['sources']
+            state.batter_totals = saved['batter_totals']
+            state.batter_max_exit_velocity = saved['batter_max_exit_velocity']
+            state.batter_zones = saved['batter_zones']
+            if 'pitcher_speed' in saved and saved['pitcher_speed'].shape[1] == len(PITCHER_STATS):
+                state.pitcher_speed = saved['pitcher_speed']
+                state.pitcher_spin = saved['pitcher_spin']
+            elif 'pitcher_speed' in saved:
+                state.pitcher_speed = _from_welford(saved['pitcher_speed'])
+                state.pitcher_spin = _from_welford(saved['pitcher_spin'])
+            else:
+                state.pitcher_speed, state.pitcher_spin = _from_sum_of_squares(saved['pitcher_totals'],
+                                                                               saved['pitcher_max'])
+            state.pitch_type_counts = saved['pitch_type_counts']
+        return state
+
+
+def _running_stat(fields):
+    # RunningStat from a row of PITCHER_STATS
+    stat = RunningStat()
+    for field, value in zip(PITCHER_STATS, fields):
+        setattr(stat, field, value)
+    stat.count = int(stat.count)
+    return stat
+
+
+def _from_welford(stats):
+    # states saved with (count, total, mean, m2, max) rows; the rounding remainders are lost
+    count, total, mean, m2, maximum = stats.T
+    zeros = np.zeros(len(stats))
+    return np.column_stack([count, total, zeros, m2 + total * mean, zeros, maximum])
+
+
+def _from_sum_of_squares(totals, maxima):
+    # states saved before that kept (pitches, speed, spin, speed^2, spin^2) sums
+    # and NaN-initialized maxima
+    result = []
+    zeros = np.zeros(len(totals))
+    for column, squares_column, max_column in ((1, 3, 0), (2, 4, 1)):
+        maximum = np.nan_to_num(maxima[:, max_column], nan=0.0)
+        result.append(np.column_stack([totals[:, 0], totals[:, column], zeros, totals[:, squares_column], zeros,
+                                       maximum]))
+    return result
+
+
+def check_pitchers(state, data):
+    """
+    Compare a state's pitchers with load_pitchers on the same rows.
+
+    Args:
+        state (SeasonState): State with data folded in (and nothing else).
+        data (pd.DataFrame or PitchTable): The rows that were folded.
+
+    Returns:
+        list: Names of the pitchers whose avg/max/std speed and spin or pitch
+        type counts don't match exactly, empty when everything matches.
+    """
+    fields = ('avg_speed', 'avg_spin', 'max_speed', 'max_spin', 'speed_std', 'spin_std', 'pitch_mix')
+    expected = load_pitchers(data)
+    mismatches = []
+    for name, pitcher in expected.items():
+        folded = state.pitcher(name) if name in state.dictionaries['Pitcher'] else None
+        same = folded is not None and all(np.array_equal(getattr(folded, f), getattr(pitcher, f), equal_nan=True)
+                                          for f in fields)
+        # Counter keys compare by ==, so the blank pitch type (NaN) is checked apart
+        same = same and ({t: n for t, n in folded.pitch_type_counts.items() if t == t}
+                         == {t: n for t, n in pitcher.pitch_type_counts.items() if t == t})
+        same = same and (sum(n for t, n in folded.pitch_type_counts.items() if t != t)
+                         == sum(n for t, n in pitcher.pitch_type_counts.items() if t != t))
+        if not same:
+            mismatches.append(name)
+    return mismatches
+
+
+def stream_batter(path, name, filters=None, chunksize=100_000, role="general", grid=None):
+    """
+    A batter's stats from a CSV read in chunks, for files too big to load at once.
+
+    Only one chunk and the batter's accumulators are in memory at a time. Gives
+    the same numbers as filter_pitches on the whole file (and filter_batter
+    when filters are given).
+
+    Args:
+        path (str): CSV in the master CSV layout.
+        name (str): Batter name.
+        filters (tuple): (has_outcome, type_pitches, velo_min, velo_max, spin_min, spin_max)
+            as in create_strike_zone_plot_from_pitches, defaults to every pitch.
+        chunksize (int): Rows per chunk.
+        role (str): Role given to the Batter.
+        grid (ZoneGrid): Plate zone layout, defaults to the 4x4 strike zone grid.
+
+    Returns:
+        Batter: With calculate_stats already run, None if the batter isn't in the
+        file. A batter whose pitches all miss the filters gets zeroed stats, like
+        filter_batter.
+    """
+    from pitch_query import PitchQuery
+
+    state = SeasonState(grid)
+    # the batter's code is the same in every chunk, so chunks are filtered on codes
+    batters = CategoryDictionary()
+    code = batters.add(name)
+    seen = False  # the batter is in the file, even if no pitch passes the filters
+    for chunk in iter_master_csv(path, chunksize, dictionaries={'Batter': batters}):
+        mine = chunk[chunk['Batter'].cat.codes.to_numpy() == code]
+        if mine.empty:
+            continue
+        seen = True
+        table = PitchTable(mine, report=False)
+        state.unknown_outcomes.update(table.unknown_outcomes)
+        state.fold(table, None if filters is None else PitchQuery(table).select(*filters))
+    if not seen:
+        return None
+    if name not in state.dictionaries['Batter']:
+        # nothing was folded, give the batter a row of zeros
+        state.dictionaries['Batter'].add(name)
+        state._grow()
+    batter = state.batter(name, role)
+    # every chunk's unknown calls, printed once by calculate_stats
+    batter.unknown_outcomes.update(state.unknown_outcomes)
+    batter.calculate_stats()
+    return batter
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fold new game CSVs into a saved season state.")
+    parser.add_argument("state", help="season state file (.npz), created if it doesn't exist")
+    parser.add_argument("csv", nargs="+", help="game CSV in the master CSV layout, can be repeated")
+    parser.add_argument("--chunksize", type=int, metavar="ROWS",
+                        help="read each CSV this many rows at a time, for files bigger than memory")
+    args = parser.parse_args()
+
+    state = SeasonState.load(args.state) if os.path.exists(args.state) else SeasonState()
+    for path in args.csv:
+        if state.fold_csv(path, args.chunksize):
+            print("Added", path)
+    state.save(args.state)
+    print(len(state.batter_names), "batters and", len(state.pitcher_names), "pitchers in", args.state)
+
+
+if __name__ == "__main__":
+    main()
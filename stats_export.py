@@ -0,0 +1,247 @@
+import argparse
+import gzip
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from barchart import (BATTER_TOTALS, DEFAULT_ZONE_GRID, PitchTable, batter_increments, batting_stats_frame,
+                      plate_zone_rates, zone_increments)
+from csv_cache import load_master_csv
+from pitch_query import FOUR_SEAM_GROUP
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Batter.get_stats keys in order, every record has them plus 'split'
+STAT_KEYS = ('hits', 'walks', 'strikeouts', 'total bases', 'plate appearences', 'avg', 'obp', 'slg', 'ops',
+             'wobp', 'k_rate', 'bb_rate', 'avg_exit_velocity', 'avg_launch_angle', 'max_exit_velocity')
+# plate_zone_stats columns, flattened to zone<N>_<stat> in columnar files
+ZONE_STATS = ('avg', 'slg', 'ev', 'whiff')
+
+
+def split_stats(data, grid=None):
+    """
+    Stats of every batter for "All" and every pitch type they've seen, in one grouped pass.
+
+    Each split gives the same numbers as filter_batter(batter, False, split,
+    0, 200, 0, 4000).get_stats() (and so as the per-batter player_jsons files):
+    "Four-Seam" also counts cutters and sinkers, and a batter only gets a split
+    for a pitch type they've actually seen. Rows within each split are summed
+    in file order, like filter_batter does, so the floats match exactly.
+
+    Args:
+        data (pd.DataFrame or PitchTable): The master CSV.
+        grid (ZoneGrid): Plate zone layout, defaults to the 4x4 strike zone grid.
+
+    Yields:
+        dict: One record per batter and split, batters in order of first
+        appearance and splits as in batch_reports.pitch_type_splits.
+    """
+    table = data if isinstance(data, PitchTable) else PitchTable(data)
+    grid = grid if grid is not None else DEFAULT_ZONE_GRID
+    batter_names = table.frame['batter_name'].cat.categories
+    type_names = table.frame['pitch_type'].cat.categories
+    batter_codes = table.codes('batter_name')
+    type_codes = table.codes('pitch_type')
+    splits = 1 + len(type_names)  # split 0 is "All", split 1 + code is that pitch type
+
+    # every (row, split) membership: every row counts for "All" and its own
+    # pitch type, cutters and sinkers also count for "Four-Seam"
+    rows = np.flatnonzero(batter_codes >= 0)
+    typed = rows[type_codes[rows] >= 0]
+    member_rows = [typed]
+    member_splits = [1 + type_codes[typed]]
+    if "Four-Seam" in type_names:
+        group = table.lookup('pitch_type', dict.fromkeys(FOUR_SEAM_GROUP, True), typed, default=False)
+        member_rows.append(typed[group])
+        member_splits.append(np.full(group.sum(), 1 + type_names.get_loc("Four-Seam")))
+    member_rows = np.concatenate(member_rows)
+    member_splits = np.concatenate(member_splits)
+    # back to file order, so each split's rows are added in the same order filter_batter adds them
+    order = np.argsort(member_rows, kind='stable')
+    member_rows = np.concatenate([rows, member_rows[order]])
+    member_splits = np.concatenate([np.zeros(len(rows), dtype=np.intp), member_splits[order]])
+
+    keys = batter_codes[member_rows].astype(np.int64) * splits + member_splits
+    pairs, pair = np.unique(keys, return_inverse=True)
+    n = len(pairs)
+    # a batter only has a pitch type split when they've seen that pitch type itself
+    own = (member_splits == 0) | (member_splits == 1 + type_codes[member_rows])
+    seen = np.zeros(n, dtype=bool)
+    seen[pair[own]] = True
+    first_row = np.full(n, len(table), dtype=np.intp)
+    np.minimum.at(first_row, pair[own], member_rows[own])
+
+    increments, contact_exit_velocity = batter_increments(table, rows)
+    row_position = np.zeros(len(table), dtype=np.intp)
+    row_position[rows] = np.arange(len(rows))
+    members = row_position[member_rows]
+    totals = np.zeros((n, len(BATTER_TOTALS)))
+    np.add.at(totals, pair, increments[members])
+    max_exit_velocity = np.zeros(n)
+    np.fmax.at(max_exit_velocity, pair, contact_exit_velocity[members])
+    zones, zone_counts = zone_increments(table, rows, grid)
+    counts = np.zeros((n, grid.zone_count, 10))
+    np.add.at(counts, (pair, zones[members]), zone_counts[members])
+
+    stats = batting_stats_frame(totals, max_exit_velocity, np.arange(n))
+    columns = {key: stats[key].tolist() for key in STAT_KEYS}
+    zone_rates = plate_zone_rates(counts).tolist()
+
+    # batters by first appearance, then "All" and pitch types by first appearance
+    pair_batters, pair_splits = np.divmod(pairs, splits)
+    batter_first = np.full(len(batter_names), len(table), dtype=np.intp)
+    np.minimum.at(batter_first, pair_batters, first_row)
+    for i in np.lexsort((first_row, pair_splits > 0, batter_first[pair_batters])):
+        if not seen[i]:
+            continue
+        split = pair_splits[i]
+        record = {'name': batter_names[pair_batters[i]], 'split': "All" if split == 0 else type_names[split - 1],
+                  'role': "Custom"}
+        for key in STAT_KEYS:
+            record[key] = columns[key][i]
+        record['plate_zone_stats'] = dict(enumerate(zone_rates[i]))
+        yield record
+
+
+class JsonLinesWriter:
+    """
+    Writes records as JSON Lines, one compact object per line, as they come in.
+
+    Uses orjson when it's installed (several times faster), the json module
+    otherwise. Paths ending in .gz are gzip compressed.
+    """
+    def __init__(self, path, compress=None):
+        self.path = path
+        compress = path.endswith(".gz") if compress is None else compress
+        self._file = gzip.open(path, 'wb', compresslevel=6) if compress else open(path, 'wb')
+        self.records = 0
+
+    def write(self, record):
+        if orjson is not None:
+            # orjson wants str keys, plate_zone_stats is keyed by zone number
+            line = orjson.dumps(record, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE)
+        else:
+            line = (json.dumps(record, separators=(',', ':')) + "\n").encode()
+        self._file.write(line)
+        self.records += 1
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    """
+    Writes records to a Parquet table, one row per record, plate_zone_stats
+    flattened to zone<N>_avg/_slg/_ev/_whiff columns.
+
+    Records are buffered and written as a row group every batch_size rows, so
+    memory stays flat however many batters there are. Needs pyarrow.
+    """
+    def __init__(self, path, compression="zstd", batch_size=10_000):
+        if pq is None:
+            raise ImportError("the parquet format needs pyarrow, use --format jsonl instead")
+        self.path = path
+        self.compression = compression
+        self.batch_size = batch_size
+        self.records = 0
+        self._rows = []
+        self._writer = None
+
+    def write(self, record):
+        row = {key: value for key, value in record.items() if key != 'plate_zone_stats'}
+        for zone, rates in record['plate_zone_stats'].items():
+            for stat, value in zip(ZONE_STATS, rates):
+                row[f'zone{zone}_{stat}'] = value
+        self._rows.append(row)
+        self.records += 1
+        if len(self._rows) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return
+        batch = pa.Table.from_pylist(self._rows, schema=self._writer.schema if self._writer else None)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, batch.schema, compression=self.compression)
+        self._writer.write_table(batch)
+        self._rows = []
+
+    def close(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+
+
+def open_writer(path, fmt=None, compress=None):
+    """
+    Writer for path: "parquet" for .parquet files, JSON Lines otherwise.
+
+    Args:
+        path (str): Output file.
+        fmt (str): "jsonl" or "parquet", defaults to the file extension.
+        compress (bool): gzip JSON Lines, defaults to True for .gz paths.
+            Parquet is always compressed (zstd).
+    """
+    fmt = fmt or ("parquet" if path.endswith(".parquet") else "jsonl")
+    if fmt == "parquet":
+        return ParquetWriter(path)
+    return JsonLinesWriter(path, compress)
+
+
+def export_stats(data, path, fmt=None, compress=None, grid=None):
+    """
+    Stream every batter x split record from split_stats into one file.
+
+    Returns:
+        int: Records written.
+    """
+    writer = open_writer(path, fmt, compress)
+    try:
+        for record in split_stats(data, grid):
+            writer.write(record)
+    finally:
+        writer.close()
+    return writer.records
+
+
+def read_stats(path):
+    """
+    Load an export back in one read, one row per batter and split.
+
+    Returns:
+        pd.DataFrame: JSON Lines keep plate_zone_stats as a column of dicts,
+        Parquet has the flattened zone columns.
+    """
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_json(path, lines=True, compression="gzip" if path.endswith(".gz") else None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export every batter x pitch type split's stats to one file.")
+    parser.add_argument("out", help="output file: .jsonl, .jsonl.gz or .parquet")
+    parser.add_argument("--csv", default="Regular Season Master CSV.csv", help="master CSV file")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], help="defaults to the file extension")
+    parser.add_argument("--gzip", action="store_true", help="gzip JSON Lines output whatever the extension")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    records = export_stats(load_master_csv(args.csv), args.out, args.format, True if args.gzip else None)
+    print(f"Saved {records} records to {args.out} ({os.path.getsize(args.out)} bytes) "
+          f"in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
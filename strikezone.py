@@ -1,23 +1,6 @@
-import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
-import plotly.io as pio
-from barchart import Batter
-
-def get_zone_number(x, y, zone_width, zone_height_low, zone_height_high):
-    import numpy as np
-    x_sections = np.linspace(-zone_width/2, zone_width/2, 5)
-    y_sections = np.linspace(zone_height_high, zone_height_low, 5)
-
-    zone_num = 0
-    for row in range(4):
-        for col in range(4):
-            x_min, x_max = x_sections[col], x_sections[col+1]
-            y_max, y_min = y_sections[row], y_sections[row+1]
-            if (x_min <= x <= x_max) and (y_min <= y <= y_max):
-                zone_num = row * 4 + col + 1
-                break
-    return zone_num
+from barchart import Batter, get_zone_number, get_zone_numbers
 
 def create_strike_zone_plot(data, title="Pitch Location Plot", batter=None, zone_stat_index=None, enable_heatmap=False):
     """
@@ -35,6 +18,8 @@ def create_strike_zone_plot(data, title="Pitch Location Plot", batter=None, zone
     Returns:
         dict: Plotly figure dictionary with data and layout
     """
+    import plotly.graph_objects as go
+
     try:
         # Define strike zone coordinates
         zone_width = 17 * 0.0833  # 17 inches converted to feet
@@ -42,13 +27,7 @@ def create_strike_zone_plot(data, title="Pitch Location Plot", batter=None, zone
         zone_height_high = 3.5    # Approximately mid-chest height
 
         # Add zone numbers to the data
-        data['Zone'] = data.apply(lambda row: get_zone_number(
-            row['PlateLocSide'], 
-            row['PlateLocHeight'],
-            zone_width,
-            zone_height_low,
-            zone_height_high
-        ), axis=1)
+        data['Zone'] = get_zone_numbers(data['PlateLocSide'], data['PlateLocHeight'], zone_width, zone_height_low, zone_height_high)
 
         # Check if exit velo and launch angle are nan and set them to 0.0
         if 'exit_Velocity' in data.columns:
@@ -165,7 +144,7 @@ def create_strike_zone_plot(data, title="Pitch Location Plot", batter=None, zone
                     x_center = (x_sections[col] + x_sections[col + 1]) / 2
                     y_center = (y_sections[row] + y_sections[row + 1]) / 2
 
-                    if z_num in batter.plate_zone_stats:
+                    if z_num < len(batter.plate_zone_stats):
 
                         print(batter.plate_zone_stats[z_num][zone_stat_index])
                         stat_value = float('{:.3g}'.format(batter.plate_zone_stats[z_num][zone_stat_index]))